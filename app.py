@@ -1,13 +1,18 @@
 import os  # Provides a way of interacting with the operating system (used for environment variables)
+import sys  # Used to read command-line flags
+import time  # Used to enforce per-request time limits on streamed answers and to time startup
 import json  # Used for parsing JSON data (to handle request/response data)
-from flask import Flask, request, jsonify, send_from_directory  # Flask modules to create the web app and handle HTTP requests
-from langchain_chroma import Chroma  # Chroma is a vector store used to store and retrieve embeddings
-from langchain_community.embeddings.ollama import OllamaEmbeddings  # OllamaEmbeddings is used to generate embeddings from text
-from langchain_community.chat_models import ChatOllama  # ChatOllama is a language model for handling chat-based queries
-from langchain.memory import ConversationBufferMemory  # ConversationBufferMemory stores chat history in memory
-from query_handler import handle_query  # A custom function for handling queries (imported from another file)
+import uuid  # Used to generate request IDs
+import threading  # Used to run the warm-up in the background
+from contextlib import contextmanager  # Used to time the startup phases
+_import_start = time.perf_counter()
+from flask import Flask, Response, g, request, jsonify, send_from_directory, stream_with_context  # Flask modules to create the web app and handle HTTP requests
+from concurrency import LLMGate, ServerBusy, RequestTimeout  # Bounded LLM concurrency and request queueing
+from session_store import SessionStore, window_messages  # Server-side chat sessions with token-budgeted history
+import metrics  # Per-stage timings and Prometheus metrics, enabled with METRICS_ENABLED=true
 from dotenv import load_dotenv  # Used to load environment variables from a .env file
 import logging  # Provides logging functionality to track the state of the app
+# LangChain, Chroma and the query handler take seconds to import; they are imported in init_components()
 
 # Set environment variables for LangChain (e.g., API key, tracing, project name)
 os.environ['LANGCHAIN_TRACING_V2'] = 'true'
@@ -17,6 +22,8 @@ os.environ['LANGCHAIN_PROJECT'] = "AI_CM"
 
 # Load environment variables from a .env file
 load_dotenv()  # This will load additional environment variables if they're stored in a .env file
+# metrics read METRICS_ENABLED when it was imported, before the .env file was loaded
+metrics.enable(os.getenv("METRICS_ENABLED", "false").lower() == "true")
 
 # Set up logging to record messages and errors (INFO level logs general information)
 logging.basicConfig(level=logging.INFO)
@@ -24,28 +31,271 @@ logging.basicConfig(level=logging.INFO)
 # Initialize the Flask application
 app = Flask(__name__)  # 'app' is the main Flask application
 
-# Initialize components for embeddings and chat model
-
-try:
-    # Create an instance of OllamaEmbeddings using the 'nomic-embed-text' model
-    embedding = OllamaEmbeddings(model="nomic-embed-text")
-except ValueError as e:
-    # If there's an error loading the specific model, log the error and fall back to the default model
-    logging.error(f"Error initializing embeddings: {e}")
-    embedding = OllamaEmbeddings(model="default-model")
-
-# Initialize Chroma vector store (for storing and retrieving embeddings)
-vector_store = Chroma(
-    collection_name="devhtml2",  # The name of the collection in the vector store
-    embedding_function=embedding,  # The embedding function used to convert text to vectors
-    persist_directory="./chroma_db2"  # Directory where the vector store's data is saved
+# Components for embeddings, retrieval and the chat model; built by init_components() on
+# startup (in the background) or by the first request that needs them
+embedding = None
+vector_store = None
+lexical_index = None
+answer_cache = None
+llm = None
+
+# Retrieval mode: "vector" (default), "hybrid" (BM25 + embeddings) or "lexical" (BM25 only)
+retrieval_mode = os.getenv("RETRIEVAL_MODE", "vector")
+
+# Startup state reported by /readyz: seconds per phase, and whether the components are built and warmed up
+startup_phases = {"imports": round(time.perf_counter() - _import_start, 3)}
+components_initialized = threading.Event()
+warmed_up = threading.Event()
+warm_up_error = None
+_init_lock = threading.Lock()
+_warm_up_lock = threading.Lock()
+_warm_up_thread = None
+
+# Warm the models up in the background on startup (disable to build components on the first request instead)
+warm_up_enabled = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+
+@contextmanager
+def startup_phase(name):
+    """
+    Time one startup phase and log how long it took.
+    """
+    start_time = time.perf_counter()
+    yield
+    startup_phases[name] = round(time.perf_counter() - start_time, 3)
+    logging.info(f"Startup phase '{name}' took {startup_phases[name]}s")
+
+def init_components():
+    """
+    Build the embeddings model, vector store, lexical index, answer cache and chat model once.
+    Safe to call from several threads; later calls return immediately.
+    """
+    global embedding, vector_store, lexical_index, answer_cache, llm
+    if components_initialized.is_set():
+        return
+    with _init_lock:
+        if components_initialized.is_set():
+            return
+
+        with startup_phase("langchain_imports"):
+            from langchain_community.embeddings.ollama import OllamaEmbeddings  # OllamaEmbeddings is used to generate embeddings from text
+            from langchain_community.chat_models import ChatOllama  # ChatOllama is a language model for handling chat-based queries
+            from cache import CachedEmbeddings, SemanticAnswerCache, file_version  # Question embedding and answer caches
+            import query_handler  # noqa: F401  (loaded now so the first request doesn't pay for it)
+
+        with startup_phase("embeddings"):
+            try:
+                # Create an instance of OllamaEmbeddings using the 'nomic-embed-text' model
+                base_embedding = OllamaEmbeddings(model="nomic-embed-text")
+            except ValueError as e:
+                # If there's an error loading the specific model, log the error and fall back to the default model
+                logging.error(f"Error initializing embeddings: {e}")
+                base_embedding = OllamaEmbeddings(model="default-model")
+
+            # Cache question embeddings so repeated questions skip the Ollama round trip
+            new_embedding = CachedEmbeddings(base_embedding, maxsize=int(os.getenv("EMBEDDING_CACHE_SIZE", "1024")))
+
+        with startup_phase("vector_store"):
+            # Initialize the vector store: Chroma by default, or the memory-mapped NumPy export
+            # (python load_data.py --export-numpy) which loads faster and is shared between workers
+            vector_backend = os.getenv("VECTOR_BACKEND", "chroma")
+            if vector_backend == "numpy":
+                from numpy_store import NumpyVectorStore
+                new_vector_store = NumpyVectorStore("./numpy_store", embedding_function=new_embedding)
+            else:
+                from langchain_chroma import Chroma  # Chroma is a vector store used to store and retrieve embeddings
+                # Initialize Chroma vector store (for storing and retrieving embeddings)
+                new_vector_store = Chroma(
+                    collection_name="devhtml2",  # The name of the collection in the vector store
+                    embedding_function=new_embedding,  # The embedding function used to convert text to vectors
+                    persist_directory="./chroma_db2"  # Directory where the vector store's data is saved
+                )
+
+        # Load the lexical index only when it is used
+        new_lexical_index = None
+        if retrieval_mode != "vector":
+            with startup_phase("lexical_index"):
+                from lexical_index import BM25Index  # BM25 index built by load_data.py next to the Chroma data
+                new_lexical_index = BM25Index.load("./chroma_db2/bm25_index.json")
+                logging.info(f"Loaded BM25 index with {len(new_lexical_index)} documents")
+
+        # Optionally reuse answers of near-identical questions; the cache is dropped whenever
+        # load_data.py rewrites the ingest manifest, i.e. whenever the index changes
+        new_answer_cache = None
+        if os.getenv("ANSWER_CACHE_ENABLED", "false").lower() == "true":
+            new_answer_cache = SemanticAnswerCache(
+                threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),  # Minimum cosine similarity for a hit
+                ttl=float(os.getenv("ANSWER_CACHE_TTL", "3600")),  # Seconds before a cached answer expires
+                maxsize=int(os.getenv("ANSWER_CACHE_SIZE", "256")),  # Maximum number of cached answers
+                index_version=file_version("./chroma_db2/ingest_manifest.json")
+            )
+
+        # Initialize the language model for chat interactions
+        new_llm = ChatOllama(model="llama3")  # The chat model used for processing and responding to user questions
+
+        embedding, vector_store, lexical_index = new_embedding, new_vector_store, new_lexical_index
+        answer_cache, llm = new_answer_cache, new_llm
+        components_initialized.set()
+
+def warm_up():
+    """
+    Build the components, then run a dummy embedding, a dummy search and a one-token generation
+    so the first user doesn't wait for Ollama to load the models or for a cold index.
+    Retries with backoff while Ollama is unreachable; /readyz turns ready once it succeeds.
+    """
+    global warm_up_error
+    started = time.perf_counter()
+    delay = 1.0
+    while True:
+        try:
+            init_components()
+            with startup_phase("warm_up_embedding"):
+                query_embedding = embedding.embed_query("warm-up")
+            with startup_phase("warm_up_search"):
+                vector_store.similarity_search_by_vector(query_embedding, k=1)
+            with startup_phase("warm_up_generation"):
+                llm.invoke("Hi", num_predict=1)  # Loads the chat model into memory without a full answer
+            break
+        except Exception as e:
+            warm_up_error = str(e)
+            logging.warning(f"Warm-up failed, retrying in {delay:.0f}s: {e}")
+            time.sleep(delay)
+            delay = min(delay * 2, 60)
+
+    warm_up_error = None
+    startup_phases["startup_total"] = round(time.perf_counter() - started + startup_phases["imports"], 3)
+    logging.info(f"Ready after {startup_phases['startup_total']}s: {json.dumps(startup_phases)}")
+    warmed_up.set()
+
+def start_warm_up():
+    """
+    Start the warm-up in a background thread (only once per process).
+    """
+    global _warm_up_thread
+    with _warm_up_lock:
+        if _warm_up_thread is None:
+            _warm_up_thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+            _warm_up_thread.start()
+
+# Keep chat history on the server so clients only send a session ID with each question
+session_store = SessionStore(
+    ttl=float(os.getenv("SESSION_TTL", "3600")),  # Seconds of inactivity before a session is dropped
+    max_sessions=int(os.getenv("SESSION_MAX", "1000")),  # Maximum number of sessions kept in memory
+    max_history_tokens=int(os.getenv("HISTORY_MAX_TOKENS", "1000")),  # Chat history token budget per prompt
+    summarize=os.getenv("HISTORY_SUMMARY_ENABLED", "false").lower() == "true"  # Summarize turns that fall out of the budget
 )
 
-# Initialize a memory object to store chat history between the user and the AI
-memory = ConversationBufferMemory()  # This will keep track of conversation history between turns
+# Limit how many generations hit Ollama at once; extra requests wait in a bounded queue or get a 503
+llm_gate = LLMGate(
+    max_in_flight=int(os.getenv("LLM_MAX_IN_FLIGHT", "2")),  # Simultaneous generations
+    max_queue=int(os.getenv("LLM_MAX_QUEUE", "8")),  # Requests allowed to wait for a slot
+    queue_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT", "30")),  # Seconds a request may wait in the queue
+    retry_after=int(os.getenv("LLM_RETRY_AFTER", "5"))  # Retry-After value sent with 503 responses
+)
 
-# Initialize the language model for chat interactions
-llm = ChatOllama(model="llama3")  # The chat model used for processing and responding to user questions
+# Maximum number of seconds a single request may take before it is answered with a 504
+request_timeout = float(os.getenv("REQUEST_TIMEOUT", "120"))
+
+# Batch requests: maximum number of questions per request and of generations run in parallel for one batch
+batch_max_questions = int(os.getenv("BATCH_MAX_QUESTIONS", "500"))
+batch_max_concurrency = int(os.getenv("BATCH_MAX_CONCURRENCY", str(llm_gate.max_in_flight)))
+
+# Expose the LLM gate's occupancy on /metrics
+metrics.register(metrics.Gauge("llm_generations_in_flight", "LLM generations currently running.",
+                               callback=lambda: llm_gate.in_flight))
+metrics.register(metrics.Gauge("llm_requests_queued", "Requests waiting for an LLM slot.",
+                               callback=lambda: llm_gate.waiting))
+
+@app.before_request
+def start_request():
+    """
+    Assign a request ID and start collecting stage timings (only when metrics are enabled).
+    """
+    if not metrics.ENABLED:
+        return
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex  # Keep the caller's ID if it sent one
+    g.start_time = time.perf_counter()
+    g.trace = metrics.start_trace()
+    metrics.REQUESTS_IN_FLIGHT.inc()
+
+@app.after_request
+def finish_request(response):
+    """
+    Record the request's latency and write its log line; streamed responses do so once the stream ends.
+    """
+    if not metrics.ENABLED or 'request_id' not in g:
+        return response
+    response.headers['X-Request-ID'] = g.request_id
+
+    # Capture everything now: the request context is gone when a stream is closed
+    log_fields = {
+        "request_id": g.request_id,
+        "method": request.method,
+        "path": request.path,
+        "endpoint": request.endpoint,
+        "status": response.status_code
+    }
+    start_time, trace = g.start_time, g.trace
+
+    def finish():
+        metrics.end_trace()
+        duration = time.perf_counter() - start_time
+        metrics.REQUEST_SECONDS.observe(duration, endpoint=log_fields["endpoint"], status=log_fields["status"])
+        metrics.REQUESTS_IN_FLIGHT.dec()
+        log_fields["duration_ms"] = round(duration * 1000, 1)
+        # Copy first: a timed-out generation may still be adding stages from its own thread
+        log_fields["stages_ms"] = {stage: round(seconds * 1000, 1) for stage, seconds in dict(trace).items()}
+        logging.info(json.dumps(log_fields))
+
+    if response.is_streamed:
+        response.call_on_close(finish)
+    else:
+        finish()
+    return response
+
+def resolve_chat_history(data):
+    """
+    Return the session ID and the chat history to put in the prompt for a request.
+    Requests with a session ID (or without any history) use a server-side session; legacy
+    clients that send their own chat_history get None as session ID.
+    """
+    if 'chat_history' in data and not data.get('session_id'):
+        # Only the most recent part of a client-provided history goes into the prompt
+        _, recent_messages = window_messages(data['chat_history'], session_store.max_history_tokens)
+        return None, recent_messages
+
+    session_id = session_store.get_or_create(data.get('session_id'))
+    return session_id, session_store.prompt_history(session_id)
+
+def complete_response(response, question, session_id, client_history):
+    """
+    Record the new turn and shape the response for session or legacy clients.
+    """
+    if session_id is None:
+        # Legacy contract: send the whole updated chat history back
+        update_chat_history(client_history, question, response)
+        response["chat_history"] = client_history
+    else:
+        # Session clients only receive the new turn
+        response.pop("chat_history", None)
+        response["session_id"] = session_id
+        response["turn"] = session_store.add_turn(session_id, question, response["answer"], llm)
+    return response
+
+def answer_question(question, session_id, prompt_history, client_history, trace=None):
+    """
+    Answer a question and record it in its session (runs inside an LLM slot).
+    """
+    from query_handler import handle_query  # Already imported by init_components()
+    # This runs on an LLM gate thread, so record the stage timings into the request's trace
+    metrics.use_trace(trace)
+    try:
+        response = handle_query(
+            vector_store, embedding, llm, question, prompt_history,
+            answer_cache=answer_cache, lexical_index=lexical_index, retrieval_mode=retrieval_mode
+        )
+        return complete_response(response, question, session_id, client_history)
+    finally:
+        metrics.end_trace()
 
 # Define the '/query' endpoint to handle POST requests
 @app.route('/query', methods=['POST'])
@@ -55,33 +305,30 @@ def query():
     """
     data = request.json  # Get the request data, assuming it's in JSON format
     question = data.get('question')  # Extract the 'question' field from the request
-    chat_history = data.get('chat_history', [])  # Get the previous chat history, or start with an empty list
+    client_history = data.get('chat_history', [])  # Chat history sent by legacy clients, if any
 
     # If no question is provided in the request, return a 400 error (Bad Request)
     if not question:
         return jsonify({"error": "No question provided"}), 400
 
     try:
-        # Call the handle_query function to process the query and return a response
-        response = handle_query(vector_store, embedding, llm, question, chat_history)
+        # Build the components now if the warm-up hasn't finished doing so
+        init_components()
 
-        # Add the user's question to the chat history
-        chat_history.append({"role": "user", "content": question})
+        # Look up the session (or the client's history) to use in the prompt
+        session_id, prompt_history = resolve_chat_history(data)
 
-        # If the response contains an answer, update the chat history
-        if "answer" in response:
-            # Check if the AI's last response is already the same, avoid repeating responses
-            if chat_history and chat_history[-1].get('role') == 'ai':
-                last_ai_response = chat_history[-1].get('content')
-                if last_ai_response == response.get("answer"):
-                    chat_history.pop()  # Remove the last AI response if it's a duplicate
-
-            # Add the new AI response to the chat history
-            chat_history.append({"role": "ai", "content": response["answer"]})
-
-        # Include the updated chat history and possibly a "More Info" link in the response
-        response["chat_history"] = chat_history
+        # Process the query in an LLM slot and return a response
+        response = llm_gate.run(
+            answer_question, question, session_id, prompt_history, client_history,
+            trace=g.get('trace'), timeout=request_timeout
+        )
 
+    except ServerBusy as e:
+        # Tell the client to come back later instead of letting it wait indefinitely
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(e.retry_after)}
+    except RequestTimeout as e:
+        return jsonify({"error": str(e)}), 504
     except Exception as e:
         # Handle any errors that occur during processing and include the error message in the response
         response = {"error": str(e)}
@@ -89,6 +336,168 @@ def query():
     # Return the response as a JSON object
     return jsonify(response)
 
+# Define the '/query/batch' endpoint, which answers a list of independent questions in one request
+@app.route('/query/batch', methods=['POST'])
+def query_batch():
+    """
+    Handle a POST request to the /query/batch endpoint.
+    Expects {"questions": [...]} and returns {"results": [...]} in the same order; each result
+    has an "answer" and "more_info_url", or an "error" when that question could not be answered.
+    """
+    data = request.json or {}
+    questions = data.get('questions')
+
+    if not isinstance(questions, list) or not questions:
+        return jsonify({"error": "No questions provided"}), 400
+    if len(questions) > batch_max_questions:
+        return jsonify({"error": f"Too many questions (maximum {batch_max_questions})"}), 400
+
+    try:
+        init_components()
+        from query_handler import handle_query_batch
+
+        # Every generation takes a slot of the LLM gate, so batches share the model with interactive users
+        results = handle_query_batch(
+            vector_store, embedding, llm, questions,
+            answer_cache=answer_cache, lexical_index=lexical_index, retrieval_mode=retrieval_mode,
+            max_concurrency=batch_max_concurrency,
+            run_generation=lambda fn, *args: llm_gate.run(fn, *args, timeout=request_timeout)
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    return jsonify({"results": results})
+
+def update_chat_history(chat_history, question, response):
+    """
+    Append the user's question and the AI's answer to the chat history.
+    """
+    # Add the user's question to the chat history
+    chat_history.append({"role": "user", "content": question})
+
+    # If the response contains an answer, update the chat history
+    if "answer" in response:
+        # Check if the AI's last response is already the same, avoid repeating responses
+        if chat_history and chat_history[-1].get('role') == 'ai':
+            last_ai_response = chat_history[-1].get('content')
+            if last_ai_response == response.get("answer"):
+                chat_history.pop()  # Remove the last AI response if it's a duplicate
+
+        # Add the new AI response to the chat history
+        chat_history.append({"role": "ai", "content": response["answer"]})
+
+def format_sse(event, data):
+    """
+    Format one server-sent event with a JSON payload.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# Define the '/query/stream' endpoint, which sends the answer token by token as server-sent events
+@app.route('/query/stream', methods=['POST'])
+def query_stream():
+    """
+    Handle a POST request to the /query/stream endpoint.
+    Sends "token" events while the answer is generated and a final "done" event with the
+    full answer, the "More Info" URL and the session ID and new turn (or, for legacy
+    clients, the updated chat history).
+    """
+    data = request.json  # Get the request data, assuming it's in JSON format
+    question = data.get('question')  # Extract the 'question' field from the request
+    client_history = data.get('chat_history', [])  # Chat history sent by legacy clients, if any
+
+    # If no question is provided in the request, return a 400 error (Bad Request)
+    if not question:
+        return jsonify({"error": "No question provided"}), 400
+
+    # Build the components now if the warm-up hasn't finished doing so
+    try:
+        init_components()
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    from query_handler import stream_query
+
+    # Look up the session (or the client's history) to use in the prompt
+    session_id, prompt_history = resolve_chat_history(data)
+
+    # Take an LLM slot before the stream starts, so a full queue is still reported as a 503
+    try:
+        llm_gate.acquire()
+    except ServerBusy as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(e.retry_after)}
+
+    deadline = time.monotonic() + request_timeout
+
+    def generate():
+        try:
+            for event, payload in stream_query(vector_store, embedding, llm, question, prompt_history,
+                                               answer_cache=answer_cache, lexical_index=lexical_index,
+                                               retrieval_mode=retrieval_mode):
+                # Stop generating once the request ran out of time
+                if time.monotonic() > deadline:
+                    yield format_sse("error", {"error": f"Request did not complete within {request_timeout} seconds"})
+                    return
+                if event == "token":
+                    yield format_sse("token", {"token": payload})
+                else:
+                    # Send the final answer together with the session's new turn
+                    yield format_sse("done", complete_response(payload, question, session_id, client_history))
+        except Exception as e:
+            # Errors after the response started can only be reported as an event
+            yield format_sse("error", {"error": str(e)})
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}  # Don't let proxies buffer the stream
+    )
+    # Free the LLM slot once the stream is finished or the client went away
+    response.call_on_close(llm_gate.release)
+    return response
+
+# Report hit/miss counters of the question embedding and answer caches
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """
+    Return cache statistics as JSON.
+    """
+    return jsonify({
+        "embedding_cache": embedding.stats() if embedding else None,
+        "answer_cache": answer_cache.stats() if answer_cache else None
+    })
+
+# Liveness probe: the process is up and serving requests
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """
+    Return 200 as long as the web server is running.
+    """
+    return jsonify({"status": "ok"})
+
+# Readiness probe: the models are loaded and the index is warm
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """
+    Return 200 once the warm-up has finished, 503 before, with the startup phase timings.
+    """
+    if not warm_up_enabled:
+        # Without a warm-up the components are built by the first request
+        return jsonify({"ready": True, "phases": startup_phases})
+
+    # Servers that imported the app without running it as a script start warming up on the first probe
+    start_warm_up()
+    body = {"ready": warmed_up.is_set(), "phases": startup_phases}
+    if warm_up_error:
+        body["error"] = warm_up_error
+    return jsonify(body), 200 if warmed_up.is_set() else 503
+
+# Expose latency histograms, in-flight gauges and token counts for Prometheus
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """
+    Return all metrics in the Prometheus text format.
+    """
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
 # Serve the index.html file for the root endpoint (e.g., when visiting the home page)
 @app.route('/')
 def index():
@@ -105,6 +514,29 @@ def static_files(path):
     """
     return send_from_directory('.', path)  # Serve files from the current directory based on the given path
 
-# If this script is run directly, start the Flask development server
+def serve_production(host='0.0.0.0', port=5000):
+    """
+    Serve the app with a multi-threaded production server instead of the Flask dev server.
+    """
+    # Enough threads for every LLM slot, every queued request and some static/health requests
+    threads = llm_gate.max_in_flight + llm_gate.max_queue + 4
+    try:
+        from waitress import serve  # Optional dependency: pip install waitress
+    except ImportError:
+        logging.warning("waitress is not installed, falling back to the threaded Werkzeug server")
+        app.run(host=host, port=port, threaded=True, debug=False)
+        return
+    logging.info(f"Serving on {host}:{port} with {threads} threads")
+    serve(app, host=host, port=port, threads=threads)
+
+# If this script is run directly, start the Flask development server (or the production server with --production)
 if __name__ == '__main__':
-    app.run(debug=True)  # Run the app in debug mode for development (auto-reloads on code changes)
+    if '--production' in sys.argv[1:] or os.getenv("SERVE_MODE") == "production":
+        if warm_up_enabled:
+            start_warm_up()  # Serve /healthz right away while the models load in the background
+        serve_production(port=int(os.getenv("PORT", "5000")))
+    else:
+        # The debug reloader runs this script twice; only the child process serves requests
+        if warm_up_enabled and os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+            start_warm_up()
+        app.run(debug=True)  # Run the app in debug mode for development (auto-reloads on code changes)
@@ -0,0 +1,119 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from numpy_store import EXPORT_DTYPE  # Same dtype as load_data.py --export-numpy, so the deployed layout is measured
+
+def current_rss_mb():
+    """Return the resident set size of this process in MB."""
+    try:
+        # Linux: the current RSS, not just the peak
+        with open('/proc/self/status', 'r') as file:
+            for line in file:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource  # Unix fallback reporting the peak RSS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def percentile(values, fraction):
+    """Return the value at the given fraction (0-1) of the sorted values."""
+    ordered = sorted(values)
+    return ordered[min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)]
+
+def open_store(backend, args):
+    """Open one backend the same way app.py does, returning the store."""
+    if backend == "chroma":
+        from langchain_chroma import Chroma
+        return Chroma(collection_name=args.collection, persist_directory=args.chroma_dir)
+    from numpy_store import NumpyVectorStore
+    return NumpyVectorStore(args.numpy_dir)
+
+def measure_backend(backend, args):
+    """Measure load time, memory and query latency of one backend in this process."""
+    import numpy as np
+    queries = np.load(args.query_file)
+
+    rss_before = current_rss_mb()
+    start_time = time.perf_counter()
+    store = open_store(backend, args)
+    store.similarity_search_by_vector(queries[0], k=args.k)  # First query includes index warm-up
+    load_seconds = time.perf_counter() - start_time
+
+    latencies = []
+    for query in queries:
+        query_start = time.perf_counter()
+        store.similarity_search_by_vector(query, k=args.k)
+        latencies.append(time.perf_counter() - query_start)
+
+    result = {
+        "backend": backend,
+        "load_seconds": round(load_seconds, 4),
+        "rss_delta_mb": round(current_rss_mb() - rss_before, 1),
+        "query_p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "query_p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "queries": len(latencies)
+    }
+    if backend == "numpy":
+        result["dtype"] = str(store._refresh().vectors.dtype)  # An existing export is measured as it is
+
+    # Batched queries are only available on the NumPy store
+    if hasattr(store, "similarity_search_batch_by_vector"):
+        batch_start = time.perf_counter()
+        store.similarity_search_batch_by_vector(queries, k=args.k)
+        result["batch_query_ms_per_query"] = round((time.perf_counter() - batch_start) * 1000 / len(queries), 3)
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the Chroma and memory-mapped NumPy vector backends.")
+    parser.add_argument('--chroma-dir', default='./chroma_db2')
+    parser.add_argument('--collection', default='devhtml2')
+    parser.add_argument('--numpy-dir', default='./numpy_store')
+    parser.add_argument('--dtype', default=EXPORT_DTYPE, choices=['float16', 'float32'])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=6)
+    parser.add_argument('--backend', choices=['chroma', 'numpy'], help=argparse.SUPPRESS)  # Child process mode
+    parser.add_argument('--query-file', help=argparse.SUPPRESS)  # Query vectors prepared by the parent
+    args = parser.parse_args(argv)
+
+    if args.backend:
+        print(json.dumps(measure_backend(args.backend, args)))
+        return
+
+    import numpy as np
+    from langchain_chroma import Chroma
+    from numpy_store import NumpyVectorStore
+
+    # Export the Chroma data once so both backends hold the same vectors
+    chroma = Chroma(collection_name=args.collection, persist_directory=args.chroma_dir)
+    if not os.path.exists(os.path.join(args.numpy_dir, "CURRENT")):
+        print(f"Exporting {args.chroma_dir} to {args.numpy_dir} ({args.dtype})...")
+        NumpyVectorStore.from_chroma(chroma, args.numpy_dir, dtype=args.dtype)
+
+    # Query with stored vectors, so no embedding model is needed
+    stored = np.asarray(chroma.get(include=["embeddings"])["embeddings"], dtype=np.float32)
+    picks = np.random.default_rng(0).choice(len(stored), size=min(args.queries, len(stored)), replace=False)
+
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        query_file = os.path.join(temp_dir, "queries.npy")
+        np.save(query_file, stored[picks])
+
+        # Each backend runs in a fresh process so load time and memory are not skewed by the other
+        for backend in ("chroma", "numpy"):
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--backend', backend, '--query-file', query_file]
+                + (argv if argv is not None else sys.argv[1:]),
+                capture_output=True, text=True, check=True
+            ).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(json.dumps(results, indent=2))
+    return results
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
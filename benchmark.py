@@ -0,0 +1,279 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from data_loader import (load_html_files_to_chroma, load_json_files_to_chroma, iter_json_array,
+                         build_json_documents, MANIFEST_FILENAME)
+from query_handler import search_documents
+from fake_models import FakeOllamaEmbeddings, FakeChatOllama
+
+# Directory of this script; the exports are found relative to it so the benchmark runs from anywhere
+REPO_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+# Exports the golden questions are built from
+GOLDEN_EXPORTS = [os.path.join(REPO_DIRECTORY, 'DevelopmentContent.json'), os.path.join(REPO_DIRECTORY, 'json.json')]
+
+# Areas used for the paths and the text of synthetic pages
+SYNTHETIC_AREAS = ['analytics', 'automation', 'business', 'integration', 'presentation', 'dataplatform']
+
+def peak_rss_mb():
+    """Return the peak resident set size of this process so far in MB."""
+    import resource  # Unix only; ru_maxrss is in KB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def percentile(values, fraction):
+    """Return the value at the given fraction (0-1) of the sorted values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)]
+
+def latency_summary(latencies):
+    """Summarize latencies in seconds as p50/p99/mean milliseconds."""
+    return {
+        "count": len(latencies),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0
+    }
+
+def load_golden_queries(json_paths=GOLDEN_EXPORTS, limit=None):
+    """Build the golden query set from the topics of the JSON exports.
+
+    Every topic with a page becomes a question whose expected More Info page is that
+    topic's href, so retrieval quality can be tracked next to its speed.
+    """
+    queries = []
+    seen = set()
+    for json_path in json_paths:
+        if not os.path.exists(json_path):
+            continue
+        json_file = os.path.basename(json_path)
+        for index, (key, item) in enumerate(iter_json_array(json_path)):
+            for _, document in build_json_documents(item, json_file, f"{key}/{index}"):
+                topic = document.metadata["topic"]
+                if topic and topic not in seen:
+                    seen.add(topic)
+                    queries.append({"question": f"How does {topic} work?", "expected_url": document.metadata["base_url"]})
+    return queries[:limit] if limit else queries
+
+def generate_html_corpus(directory, pages=200, words_per_page=600, seed=0):
+    """Write synthetic pages named like the SourceFiles mirror (https___host_path.html).
+
+    Pages are built from the words of the golden topics plus navigation chrome and a
+    More Info link, so parsing, chunking and embedding see realistic input.
+    """
+    rng = random.Random(seed)
+    vocabulary = sorted({word for query in load_golden_queries() for word in query["question"].split()}) or ["mes"]
+    os.makedirs(directory, exist_ok=True)
+    for page in range(pages):
+        area = rng.choice(SYNTHETIC_AREAS)
+        slug = f"{area}_page{page}"
+        body = " ".join(rng.choice(vocabulary) for _ in range(words_per_page))
+        navigation = "".join(f'<li><a href="/{other}/">{other.title()}</a></li>' for other in SYNTHETIC_AREAS)
+        html = (
+            f"<html><head><title>{area} {page}</title></head><body>"
+            f"<nav><ul>{navigation}</ul></nav>"
+            f"<h1>{area.title()} page {page}</h1><p>{body}</p>"
+            f'<a href="https://developer.criticalmanufacturing.com/{area}/page{page}/">More Info</a>'
+            f"</body></html>"
+        )
+        filename = f"https___developer.criticalmanufacturing.com_{slug}.html"
+        with open(os.path.join(directory, filename), 'w', encoding='utf-8') as file:
+            file.write(html)
+    return directory
+
+def open_vector_store(directory, embedding):
+    """Create an empty Chroma store in directory; ingest always writes to Chroma."""
+    from langchain_chroma import Chroma
+    return Chroma(collection_name="benchmark", embedding_function=embedding,
+                  persist_directory=os.path.join(directory, "chroma"))
+
+def bench_ingest(vector_store, corpus_directory, work_directory, batch_size, max_workers):
+    """Ingest the synthetic pages and the JSON exports, returning throughput figures."""
+    manifest_path = os.path.join(work_directory, MANIFEST_FILENAME)
+    html_report = load_html_files_to_chroma(vector_store, source_folder=corpus_directory, manifest_path=manifest_path,
+                                            batch_size=batch_size, max_workers=max_workers)
+    json_report = load_json_files_to_chroma(vector_store, GOLDEN_EXPORTS, manifest_path=manifest_path,
+                                            batch_size=batch_size, max_workers=max_workers)
+    return {
+        "html_documents": html_report["documents"],
+        "html_docs_per_second": html_report["docs_per_second"],
+        "html_tokens_per_second": html_report["tokens_per_second"],
+        "json_documents": json_report["documents"],
+        "json_docs_per_second": json_report["docs_per_second"]
+    }
+
+def export_numpy_store(chroma_store, directory, embedding):
+    """Export the ingested Chroma store like load_data.py --export-numpy, returning the store and the time taken."""
+    from numpy_store import NumpyVectorStore
+    start_time = time.perf_counter()
+    store = NumpyVectorStore.from_chroma(chroma_store, os.path.join(directory, "numpy_store"),
+                                         embedding_function=embedding)
+    return store, round(time.perf_counter() - start_time, 3)
+
+def bench_retrieval(vector_store, embedding, queries, k):
+    """Time the retrieval step of every golden query and check whether its page was found."""
+    latencies = []
+    hits = 0
+    for query in queries:
+        start_time = time.perf_counter()
+        results, _, _ = search_documents(vector_store, embedding, query["question"], k)
+        latencies.append(time.perf_counter() - start_time)
+        if any(document.metadata.get("base_url") == query["expected_url"] for document in results):
+            hits += 1
+    summary = latency_summary(latencies)
+    summary["hit_rate"] = round(hits / len(queries), 3) if queries else 0.0
+    return summary
+
+def bench_query_endpoint(vector_store, embedding, llm, queries, requests, concurrency):
+    """Send golden questions to /query through the Flask test client from concurrent threads."""
+    import app as web_app  # Imported here so the other stages don't pay for the Flask app
+
+    # Keep the benchmark offline: no LangSmith tracing, fake models and the benchmark store
+    os.environ['LANGCHAIN_TRACING_V2'] = 'false'
+    web_app.embedding = embedding
+    web_app.vector_store = vector_store
+    web_app.llm = llm
+    web_app.lexical_index = None
+    web_app.answer_cache = None
+    web_app.retrieval_mode = "vector"
+    web_app.components_initialized.set()  # Keep the app from building its real components on the first request
+
+    def send(index):
+        client = web_app.app.test_client()
+        question = queries[index % len(queries)]["question"]
+        start_time = time.perf_counter()
+        response = client.post('/query', json={"question": question, "chat_history": []})
+        return response.status_code, time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(send, range(requests)))
+    elapsed = time.perf_counter() - start_time
+
+    statuses = {}
+    for status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    summary = latency_summary([latency for status, latency in results if status == 200])
+    summary.update({
+        "concurrency": concurrency,
+        "throughput_rps": round(statuses.get("200", 0) / elapsed, 3) if elapsed else 0.0,
+        "statuses": statuses
+    })
+    return summary
+
+def run_benchmark(args):
+    """Run every stage of the benchmark and return the results as a dictionary."""
+    embedding = FakeOllamaEmbeddings(call_latency=args.embed_call_latency, text_latency=args.embed_text_latency)
+    llm = FakeChatOllama(answer_tokens=args.answer_tokens, first_token_latency=args.first_token_latency,
+                         token_latency=args.token_latency)
+    queries = load_golden_queries()
+
+    results = {
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "config": {name: value for name, value in vars(args).items() if name not in ("output", "compare")},
+        "golden_queries": len(queries)
+    }
+
+    with tempfile.TemporaryDirectory() as work_directory:
+        corpus_directory = generate_html_corpus(os.path.join(work_directory, "SourceFiles"), args.pages,
+                                                args.words_per_page)
+        vector_store = open_vector_store(work_directory, embedding)
+
+        results["ingest"] = bench_ingest(vector_store, corpus_directory, work_directory,
+                                         args.batch_size, args.embed_workers)
+        if args.backend == "numpy":
+            # The NumPy store is an export of the Chroma index, so retrieval and /query run on the export
+            vector_store, results["ingest"]["numpy_export_seconds"] = export_numpy_store(
+                vector_store, work_directory, embedding)
+        results["ingest"]["embedding_calls"] = embedding.calls
+        results["ingest"]["peak_rss_mb"] = peak_rss_mb()
+
+        results["retrieval"] = bench_retrieval(vector_store, embedding, queries, args.k)
+        results["retrieval"]["peak_rss_mb"] = peak_rss_mb()
+
+        # app.py creates its own stores relative to the working directory, so import it from the scratch directory
+        original_directory = os.getcwd()
+        os.chdir(work_directory)
+        try:
+            results["query"] = bench_query_endpoint(vector_store, embedding, llm, queries,
+                                                    args.requests, args.concurrency)
+        finally:
+            os.chdir(original_directory)
+        results["query"]["peak_rss_mb"] = peak_rss_mb()
+
+    results["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+def flatten_metrics(results, prefix=""):
+    """Flatten the numeric results into {"stage.metric": value} for comparison."""
+    metrics = {}
+    for name, value in results.items():
+        if name == "config":
+            continue
+        if isinstance(value, dict):
+            metrics.update(flatten_metrics(value, f"{prefix}{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            metrics[f"{prefix}{name}"] = value
+    return metrics
+
+def compare_results(baseline, current):
+    """Print every metric of two benchmark runs side by side with the relative change."""
+    baseline_metrics = flatten_metrics(baseline)
+    current_metrics = flatten_metrics(current)
+    print(f"{'metric':40} {'baseline':>12} {'current':>12} {'change':>9}")
+    for name in sorted(set(baseline_metrics) | set(current_metrics)):
+        old, new = baseline_metrics.get(name), current_metrics.get(name)
+        change = f"{(new - old) / old * 100:+.1f}%" if old not in (None, 0) and new is not None else ""
+        print(f"{name:40} {str(old):>12} {str(new):>12} {change:>9}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Offline ingest and query benchmark using deterministic stand-ins for the Ollama models."
+    )
+    parser.add_argument('--backend', default='chroma', choices=['chroma', 'numpy'],
+                        help="Store used for retrieval and /query; numpy exports the ingested Chroma index")
+    parser.add_argument('--pages', type=int, default=200, help="Synthetic HTML pages to ingest")
+    parser.add_argument('--words-per-page', type=int, default=600)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--embed-workers', type=int, default=4)
+    parser.add_argument('--embed-call-latency', type=float, default=0.02, help="Simulated seconds per embedding call")
+    parser.add_argument('--embed-text-latency', type=float, default=0.002, help="Simulated seconds per embedded text")
+    parser.add_argument('--answer-tokens', type=int, default=64)
+    parser.add_argument('--first-token-latency', type=float, default=0.1, help="Simulated seconds before the first token")
+    parser.add_argument('--token-latency', type=float, default=0.005, help="Simulated seconds per generated token")
+    parser.add_argument('--k', type=int, default=6)
+    parser.add_argument('--requests', type=int, default=40, help="/query requests sent in the end-to-end stage")
+    parser.add_argument('--concurrency', type=int, default=8, help="Simultaneous /query clients")
+    parser.add_argument('--output', help="Where to save the results (default: benchmark-<timestamp>.json)")
+    parser.add_argument('--compare', nargs='+', metavar='RESULTS',
+                        help="Compare saved results: one file against a new run, or two files against each other")
+    args = parser.parse_args(argv)
+
+    # Comparing two saved runs needs no new run
+    if args.compare and len(args.compare) >= 2:
+        with open(args.compare[0], 'r', encoding='utf-8') as baseline_file, \
+             open(args.compare[1], 'r', encoding='utf-8') as current_file:
+            compare_results(json.load(baseline_file), json.load(current_file))
+        return
+
+    results = run_benchmark(args)
+    output_path = args.output or f"benchmark-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    with open(output_path, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f"Results saved to {output_path}")
+
+    if args.compare:
+        with open(args.compare[0], 'r', encoding='utf-8') as baseline_file:
+            compare_results(json.load(baseline_file), results)
+    return results
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
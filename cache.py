@@ -0,0 +1,194 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+def embed_query_batch(embedding, texts):
+    """Embed several questions with one embed_documents call, returning the same vectors as embed_query.
+
+    OllamaEmbeddings puts different instructions in front of documents and queries, so the
+    batch goes through a copy of the model that uses the query instruction for documents.
+    """
+    if hasattr(embedding, "query_instruction") and hasattr(embedding, "embed_instruction"):
+        embedding = embedding.model_copy(update={"embed_instruction": embedding.query_instruction})
+    return embedding.embed_documents(texts)
+
+class CachedEmbeddings(Embeddings):
+    """Wrap an embeddings model with a bounded LRU cache of query embeddings."""
+
+    def __init__(self, embedding, maxsize=1024):
+        self.embedding = embedding  # The wrapped embeddings model (e.g. OllamaEmbeddings)
+        self.maxsize = maxsize  # Maximum number of cached questions
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def embed_query(self, text):
+        """Return the embedding of a question, calling the model only on a cache miss."""
+        with self._lock:
+            if text in self._cache:
+                self._cache.move_to_end(text)  # Mark as most recently used
+                self.hits += 1
+                return self._cache[text]
+            self.misses += 1
+
+        # Call the model outside the lock so concurrent misses don't wait for each other
+        vector = self.embedding.embed_query(text)
+
+        with self._lock:
+            self._cache[text] = vector
+            self._cache.move_to_end(text)
+            # Drop the least recently used questions once the cache is full
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return vector
+
+    def embed_documents(self, texts):
+        """Embed documents without caching; ingest texts are rarely repeated."""
+        return self.embedding.embed_documents(texts)
+
+    def embed_queries(self, texts):
+        """Embed several questions, serving cached ones and embedding the rest with one model call."""
+        vectors = [None] * len(texts)
+        misses = []
+        with self._lock:
+            for index, text in enumerate(texts):
+                if text in self._cache:
+                    self._cache.move_to_end(text)
+                    self.hits += 1
+                    vectors[index] = self._cache[text]
+                else:
+                    self.misses += 1
+                    misses.append(index)
+
+        if misses:
+            # Questions repeated within the batch are embedded once
+            unique_texts = list(dict.fromkeys(texts[index] for index in misses))
+            embedded = dict(zip(unique_texts, embed_query_batch(self.embedding, unique_texts)))
+            with self._lock:
+                for text, vector in embedded.items():
+                    self._cache[text] = vector
+                    self._cache.move_to_end(text)
+                while len(self._cache) > self.maxsize:
+                    self._cache.popitem(last=False)
+            for index in misses:
+                vectors[index] = embedded[texts[index]]
+        return vectors
+
+    def clear(self):
+        """Forget all cached question embeddings."""
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self):
+        """Return hit/miss counters and the current cache size."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._cache)}
+
+class SemanticAnswerCache:
+    """Cache answers by question embedding and reuse them for near-identical questions.
+
+    A lookup hits when the cosine similarity between the new question and a cached one is at
+    least the threshold. Entries expire after ttl seconds, the oldest entries are evicted once
+    maxsize is reached, and everything is dropped when index_version() changes (i.e. when the
+    index has been rebuilt). Answers are only cached for questions asked without chat
+    history, since a follow-up's answer depends on its conversation.
+    """
+
+    def __init__(self, threshold=0.95, ttl=3600, maxsize=256, index_version=None):
+        self.threshold = threshold  # Minimum cosine similarity for a hit
+        self.ttl = ttl  # Lifetime of an entry in seconds
+        self.maxsize = maxsize  # Maximum number of cached answers
+        self.index_version = index_version  # Callable returning a token that changes on re-index
+        self._version = index_version() if index_version else None
+        self._vectors = np.empty((0, 0), dtype=np.float32)  # Normalized question embeddings, one per row
+        self._entries = []  # (created_at, answer, more_info_url), aligned with the rows above
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _check_version(self):
+        # Drop every entry when the index changed since they were stored
+        if self.index_version is None:
+            return
+        version = self.index_version()
+        if version != self._version:
+            self._version = version
+            self._clear()
+
+    def _clear(self):
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+        self._entries = []
+
+    def _expire(self, now):
+        # Entries are stored in insertion order, so expired ones are always at the front
+        expired = 0
+        while expired < len(self._entries) and now - self._entries[expired][0] > self.ttl:
+            expired += 1
+        if expired:
+            self._vectors = self._vectors[expired:]
+            self._entries = self._entries[expired:]
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, query_embedding):
+        """Return (answer, more_info_url) for a similar cached question, or None."""
+        query = self._normalize(query_embedding)
+        with self._lock:
+            self._check_version()
+            self._expire(time.time())
+            if self._entries and self._vectors.shape[1] == query.shape[0]:
+                similarities = self._vectors @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    self.hits += 1
+                    _, answer, more_info_url = self._entries[best]
+                    return answer, more_info_url
+            self.misses += 1
+            return None
+
+    def store(self, query_embedding, answer, more_info_url):
+        """Remember the answer generated for a question."""
+        query = self._normalize(query_embedding)
+        with self._lock:
+            self._check_version()
+            # Start over if the embedding model (and therefore the dimension) changed
+            if self._entries and self._vectors.shape[1] != query.shape[0]:
+                self._clear()
+            if not self._entries:
+                self._vectors = query.reshape(1, -1)
+            else:
+                self._vectors = np.vstack([self._vectors, query])
+            self._entries.append((time.time(), answer, more_info_url))
+
+            # Evict the oldest answers once the cache is full
+            overflow = len(self._entries) - self.maxsize
+            if overflow > 0:
+                self._vectors = self._vectors[overflow:]
+                self._entries = self._entries[overflow:]
+
+    def invalidate(self):
+        """Drop every cached answer, e.g. after the index has been rebuilt."""
+        with self._lock:
+            self._clear()
+
+    def stats(self):
+        """Return hit/miss counters and the current cache size."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+def file_version(path):
+    """Return a callable reporting the modification time of a file, or None while it doesn't exist."""
+    def version():
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return None
+    return version
@@ -0,0 +1,80 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+class ServerBusy(Exception):
+    """Raised when every LLM slot is taken and the wait queue is full."""
+
+    def __init__(self, message="Server busy, please retry later", retry_after=5):
+        super().__init__(message)
+        self.retry_after = retry_after  # Seconds the client should wait before retrying
+
+class RequestTimeout(Exception):
+    """Raised when a request did not finish within its time limit."""
+
+class LLMGate:
+    """Cap the number of in-flight LLM calls and queue a bounded number of waiting requests.
+
+    Requests beyond max_in_flight wait for a slot; once max_queue requests are already
+    waiting, or a slot doesn't free up within queue_timeout seconds, ServerBusy is raised
+    so the caller can answer immediately with a 503.
+    """
+
+    def __init__(self, max_in_flight=2, max_queue=8, queue_timeout=30, retry_after=5):
+        self.max_in_flight = max_in_flight  # Generations allowed to run at the same time
+        self.max_queue = max_queue  # Requests allowed to wait for a free slot
+        self.queue_timeout = queue_timeout  # Seconds a request may wait for a slot
+        self.retry_after = retry_after  # Value sent in the Retry-After header
+        self._slots = threading.Semaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="llm")
+        self.in_flight = 0
+        self.waiting = 0
+
+    def acquire(self):
+        """Take a slot, waiting in the queue if needed; raises ServerBusy when that isn't possible."""
+        # Take a free slot right away without counting as queued
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                if self.waiting >= self.max_queue:
+                    raise ServerBusy(retry_after=self.retry_after)
+                self.waiting += 1
+            try:
+                acquired = self._slots.acquire(timeout=self.queue_timeout)
+            finally:
+                with self._lock:
+                    self.waiting -= 1
+            if not acquired:
+                raise ServerBusy(retry_after=self.retry_after)
+
+        with self._lock:
+            self.in_flight += 1
+
+    def release(self):
+        """Give a slot back."""
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def run(self, fn, *args, timeout=None, **kwargs):
+        """Run fn in a slot and return its result, raising RequestTimeout after timeout seconds.
+
+        On timeout the call keeps its slot until it really finishes, so timed-out requests
+        can never push the model server past max_in_flight.
+        """
+        self.acquire()
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self.release()
+            raise
+        future.add_done_callback(lambda _: self.release())
+
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            raise RequestTimeout(f"Request did not complete within {timeout} seconds")
+
+    def stats(self):
+        """Return the number of running and waiting requests."""
+        with self._lock:
+            return {"in_flight": self.in_flight, "waiting": self.waiting}
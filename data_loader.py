@@ -1,24 +1,70 @@
 import os
+import re
+import math
+import time
+import hashlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from bs4 import BeautifulSoup
 from langchain.docstore.document import Document
 import json
+from text_utils import count_tokens
+from lexical_index import BM25Index
+from metrics import span
+from url_utils import normalize_url, url_from_filename
+from link_store import LinkStore
+from dedup import MinHasher, NearDuplicateIndex, load_signatures, save_signatures, DEDUP_THRESHOLD
+
+# Bump this whenever the way documents are built changes, so the next incremental run re-embeds everything
+MANIFEST_VERSION = 4
+
+# Name of the manifest file kept next to the Chroma data
+MANIFEST_FILENAME = "ingest_manifest.json"
+
+# Name of the BM25 lexical index file kept next to the Chroma data
+LEXICAL_INDEX_FILENAME = "bm25_index.json"
+
+# Name of the SQLite sidecar holding the full link map of every page
+LINK_STORE_FILENAME = "links.sqlite"
+
+# Name of the file holding the MinHash signature of every indexed page, used for deduplication
+SIGNATURES_FILENAME = "minhash_signatures.npz"
+
+# Defaults for the embedding stage of the ingest pipeline
+EMBED_BATCH_SIZE = 32  # Number of documents sent to the embedding model per call
+EMBED_MAX_WORKERS = 4  # Maximum number of embedding calls in flight at the same time
+EMBED_MAX_RETRIES = 3  # Number of attempts for a failing embedding batch
+
+# Defaults for the chunking stage; a chunk size of None or 0 keeps whole pages
+CHUNK_SIZE = 400  # Tokens per chunk
+CHUNK_OVERLAP = 50  # Tokens shared between consecutive chunks
+
+def select_html_parser(requested=None):
+    """Return the BeautifulSoup parser backend used for ingest.
+
+    html.parser is the default because other backends repair malformed markup differently
+    (lxml closes an unclosed <a> before the next one, changing link texts). Set HTML_PARSER=lxml
+    to opt into the faster C parser; it falls back to html.parser when lxml is not installed.
+    """
+    requested = requested or os.getenv("HTML_PARSER", "html.parser")
+    if requested == 'lxml':
+        try:
+            import lxml  # noqa: F401  (only checking that the C parser is available)
+        except ImportError:
+            return 'html.parser'
+    return requested
+
+# Parser backend used for ingest, picked once at import time
+HTML_PARSER = select_html_parser()
 
 def format_url_from_filename(filename):
     """Generate a URL from the filename by replacing underscores and adjusting the format."""
-    # Remove 'https___' and '.html' from the filename and replace underscores with slashes
-    base_path = filename.replace("https___", "").replace(".html", "")
-    base_path = base_path.replace("_", "/")
-    
-    # Construct the base URL using the modified filename
-    base_url = f"https://developer.criticalmanufacturing.com/{base_path}/"  # Ensure trailing slash
-    base_url = base_url.replace(':/', '://').replace('//', '/')  # Ensure correct URL formatting
-    return base_url
+    # Drops the 'https___' prefix, '.html' and the host (in dot or underscore form), then
+    # turns underscores into slashes; see test_url_utils.py for examples
+    return url_from_filename(filename)
 
-def extract_urls_from_html(content):
-    """Extract all URLs from HTML content along with their associated text."""
-    # Parse the HTML content using BeautifulSoup
-    soup = BeautifulSoup(content, 'html.parser')
-    
+def extract_urls_from_soup(soup):
+    """Extract all URLs from an already parsed page along with their associated text."""
     # Dictionary to store the extracted URLs
     urls = {}
     
@@ -43,67 +89,726 @@ def extract_urls_from_html(content):
     # Return the dictionary of URLs with associated text
     return urls
 
-def load_html_files_to_chroma(vector_store, source_folder='SourceFiles'):
-    """Load HTML files from the source folder into the vector store."""
+def extract_urls_from_html(content):
+    """Extract all URLs from HTML content along with their associated text."""
+    # Parse the HTML content using BeautifulSoup
+    soup = BeautifulSoup(content, 'html.parser')
+    return extract_urls_from_soup(soup)
+
+# Page chrome repeated on every page of the portal (menus, breadcrumbs, footers)
+CHROME_TAGS = ['nav', 'header', 'footer', 'aside', 'script', 'style', 'noscript']
+CHROME_ROLES = ['navigation', 'banner', 'contentinfo', 'complementary', 'search']
+
+def extract_content_text(soup):
+    """Return the text of a page's main content, without the navigation and other chrome.
+
+    Uses the <main> element (or role="main") when the page has one. Removes the chrome
+    from the soup, so call it after everything else has been read from the page.
+    """
+    content = soup.find('main') or soup.find(attrs={'role': 'main'}) or soup
+    for element in content.find_all(CHROME_TAGS) + content.find_all(attrs={'role': CHROME_ROLES}):
+        element.decompose()
+    return content.get_text(" ")
+
+def parse_html(content, parser=None, content_text=False):
+    """Parse HTML once and return both its plain text and its link map.
+
+    With content_text, the text of the main content (see extract_content_text) is returned
+    as a third value.
+    """
+    soup = BeautifulSoup(content, parser or HTML_PARSER)
+    parsed = (soup.get_text(), extract_urls_from_soup(soup))
+    return parsed + (extract_content_text(soup),) if content_text else parsed
+
+def parse_html_file(file_path, parser=None, content_text=False):
+    """Read and parse one HTML file; top-level so it can run in a worker process."""
+    with open(file_path, 'r', encoding='utf-8') as file:
+        content = file.read()  # Read the file's content as a string
+    return parse_html(content, parser, content_text)
+
+def iter_parsed_html_files(file_paths, parser=None, workers=None, content_text=False):
+    """Parse files across a process pool, yielding parse_html's output in input order.
+
+    Only a few files per worker are submitted ahead of the consumer, so a slow
+    embedding stage does not make parsed pages pile up in memory.
+    """
+    workers = workers if workers is not None else (os.cpu_count() or 1)
+    # Parsing inline avoids process start-up costs for tiny runs
+    if workers <= 1 or len(file_paths) <= 1:
+        for file_path in file_paths:
+            with span("ingest.parse"):
+                parsed = parse_html_file(file_path, parser, content_text)
+            yield parsed
+        return
+
+    def next_result(in_flight):
+        # With a pool, the parse stage is the time the pipeline waits for the next parsed page
+        with span("ingest.parse"):
+            return in_flight.popleft().result()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = deque()
+        for file_path in file_paths:
+            in_flight.append(executor.submit(parse_html_file, file_path, parser, content_text))
+            if len(in_flight) >= workers * 4:
+                yield next_result(in_flight)
+        while in_flight:
+            yield next_result(in_flight)
+
+def reference_parse_html(content):
+    """The original two-pass parsing, kept unchanged as the reference for check_parse_parity."""
+    text = BeautifulSoup(content, 'html.parser').get_text()
+    urls = {}
+    for a in BeautifulSoup(content, 'html.parser').find_all('a', href=True):
+        link_text = a.get_text().strip()
+        href = a['href']
+        if link_text and href and not href.startswith('#'):
+            if href.startswith('/developer/criticalmanufacturing/com/'):
+                href = href.replace('/developer/criticalmanufacturing/com/', '/')
+            elif not href.startswith('http'):
+                href = f"https://developer.criticalmanufacturing.com/{href.lstrip('/')}"
+            href = href.replace(':/', '://').replace('//', '/')
+            urls[link_text] = href
+    return text, urls
+
+def check_parse_parity(source_folder='SourceFiles', parser=None):
+    """Compare single-pass parsing with the original two-pass html.parser output.
+
+    Returns the names of the files whose text or link map would differ.
+    """
+    mismatches = []
+    for html_file in sorted(f for f in os.listdir(source_folder) if f.endswith('.html')):
+        with open(os.path.join(source_folder, html_file), 'r', encoding='utf-8') as file:
+            content = file.read()
+        if parse_html(content, parser) != reference_parse_html(content):
+            mismatches.append(html_file)
+    return mismatches
+
+def compute_file_hash(file_path):
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        # Read in blocks so large pages don't need to fit in memory twice
+        for block in iter(lambda: file.read(65536), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def make_document_id(filename):
+    """Build a stable document ID from the source filename."""
+    return hashlib.sha1(filename.encode('utf-8')).hexdigest()
+
+def load_manifest(manifest_path):
+    """Load the ingest manifest, returning an empty one if it is missing or outdated."""
+    empty_manifest = {"version": MANIFEST_VERSION, "files": {}}
+    if not manifest_path or not os.path.exists(manifest_path):
+        return empty_manifest
+
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as file:
+            manifest = json.load(file)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Error reading manifest {manifest_path}: {e}")
+        return empty_manifest
+
+    # A manifest written by an older document format forces a full re-embed
+    if manifest.get("version") != MANIFEST_VERSION:
+        print("Manifest version changed, all files will be re-indexed.")
+        for section, entries in manifest.items():
+            # Every section ("files", "json_files", ...) maps file names to their entries
+            if isinstance(entries, dict):
+                manifest[section] = {
+                    name: {"hash": None, "ids": entry.get("ids", [])}
+                    for name, entry in entries.items()
+                }
+        manifest["version"] = MANIFEST_VERSION
+    return manifest
+
+def save_manifest(manifest, manifest_path):
+    """Write the ingest manifest atomically so an interrupted run never leaves it half-written."""
+    if not manifest_path:
+        return
+    temp_path = f"{manifest_path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    os.replace(temp_path, manifest_path)
+
+def build_html_document(html_file, text_content, urls):
+    """Turn the parsed text of one HTML file into a Document with its resolved More Info URL.
+
+    Only the More Info URL is kept in the metadata; the page's full link map goes to the
+    link store (see load_html_files_to_chroma).
+    """
+    # Generate the base URL from the filename using the format_url_from_filename function
+    base_url = format_url_from_filename(html_file)
+
+    # Resolve the "More Info" link once here, defaulting to the base URL, so queries can use it as-is
+    more_info_url = normalize_url(urls.get('More Info') or base_url)
+
+    # Create a metadata dictionary for the Document object
+    document_metadata = {
+        "base_url": base_url,  # Include the base URL
+        "filename": html_file,  # Include the filename for reference
+        "more_info_url": more_info_url  # Canonical "More Info" link shown with answers
+    }
+
+    # Create a Document object containing the extracted text and metadata
+    return Document(page_content=text_content, metadata=document_metadata)
+
+def chunk_text(text, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    """Split text into overlapping windows of whitespace tokens.
+
+    Returns a list of (offset, chunk) pairs where offset is the character position of the
+    chunk in the original text. Chunks are exact slices of the text, so adjacent chunks can
+    be merged back together at query time. Texts that fit in one chunk are returned whole.
+    """
+    token_spans = [match.span() for match in re.finditer(r'\S+', text)]
+    if not chunk_size or len(token_spans) <= chunk_size:
+        return [(0, text)]
+
+    # Always move forward, even with an overlap as large as the chunk itself
+    step = max(chunk_size - chunk_overlap, 1)
+    chunks = []
+    for start in range(0, len(token_spans), step):
+        window = token_spans[start:start + chunk_size]
+        chunk_start, chunk_end = window[0][0], window[-1][1]
+        chunks.append((chunk_start, text[chunk_start:chunk_end]))
+        # Stop once the window reached the last token
+        if start + chunk_size >= len(token_spans):
+            break
+    return chunks
+
+def chunk_document(document, document_id, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    """Split a Document into chunk Documents, returning (chunk_id, Document) pairs.
+
+    Every chunk keeps its parent's metadata (filename, base_url, ...) plus its chunk index
+    and character offset within the parent page.
+    """
+    chunks = chunk_text(document.page_content, chunk_size, chunk_overlap)
+    chunk_documents = []
+    for chunk_index, (offset, chunk) in enumerate(chunks):
+        chunk_metadata = dict(document.metadata)
+        chunk_metadata.update({
+            "document_id": document_id,  # Parent page, e.g. to look up its links in the link store
+            "chunk_index": chunk_index,  # Position of the chunk within its page
+            "chunk_count": len(chunks),  # Number of chunks the page was split into
+            "offset": offset  # Character offset of the chunk in the page text
+        })
+        chunk_id = f"{document_id}:{chunk_index}"
+        chunk_documents.append((chunk_id, Document(page_content=chunk, metadata=chunk_metadata)))
+    return chunk_documents
+
+def batched(items, batch_size):
+    """Yield lists of at most batch_size items from any iterable."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def embed_with_retry(embedding, texts, max_retries=EMBED_MAX_RETRIES, backoff=1.0):
+    """Embed a batch of texts, retrying with exponential backoff when the call fails."""
+    for attempt in range(1, max_retries + 1):
+        try:
+            with span("ingest.embed"):
+                return embedding.embed_documents(texts)
+        except Exception as e:
+            # Give up once every attempt has been used
+            if attempt == max_retries:
+                raise
+            delay = backoff * (2 ** (attempt - 1))
+            print(f"Embedding batch failed (attempt {attempt}/{max_retries}): {e}. Retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+def write_embedded_batch(vector_store, ids, documents, embeddings):
+    """Write documents with precomputed embeddings to the vector store without embedding them again."""
+    texts = [document.page_content for document in documents]
+    metadatas = [document.metadata for document in documents]
+    # Chroma only exposes pre-embedded writes on its underlying collection
+    vector_store._collection.upsert(ids=ids, embeddings=embeddings, documents=texts, metadatas=metadatas)
+
+def run_ingest_pipeline(vector_store, items, embedding=None, batch_size=EMBED_BATCH_SIZE,
+                        max_workers=EMBED_MAX_WORKERS, max_retries=EMBED_MAX_RETRIES, on_batch_written=None):
+    """Stream (document_id, Document) pairs through the parse, embed and write stages.
+
+    Items are pulled lazily from the iterable, embedded in batches with at most max_workers
+    calls in flight and written to the vector store batch by batch, in order. Returns
+    throughput statistics for the run.
+    """
+    embedding = embedding or vector_store.embeddings
+    stats = {"documents": 0, "tokens": 0, "batches": 0}
+    start_time = time.perf_counter()
+
+    def write_next(in_flight):
+        # Wait for the oldest batch so writes happen in the same order the files were parsed
+        batch, future = in_flight.popleft()
+        embeddings = future.result()
+        ids = [document_id for document_id, _ in batch]
+        documents = [document for _, document in batch]
+        with span("ingest.write"):
+            write_embedded_batch(vector_store, ids, documents, embeddings)
+
+        stats["documents"] += len(documents)
+        stats["tokens"] += sum(count_tokens(document.page_content) for document in documents)
+        stats["batches"] += 1
+        if on_batch_written:
+            on_batch_written(batch)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = deque()
+        for batch in batched(items, batch_size):
+            texts = [document.page_content for _, document in batch]
+            in_flight.append((batch, executor.submit(embed_with_retry, embedding, texts, max_retries)))
+            # Keep the number of pending batches bounded so the corpus never sits in memory at once
+            if len(in_flight) >= max_workers:
+                write_next(in_flight)
+        while in_flight:
+            write_next(in_flight)
+
+    elapsed = time.perf_counter() - start_time
+    stats["seconds"] = round(elapsed, 3)
+    stats["docs_per_second"] = round(stats["documents"] / elapsed, 2) if elapsed else 0.0
+    stats["tokens_per_second"] = round(stats["tokens"] / elapsed, 2) if elapsed else 0.0
+    return stats
+
+def build_lexical_index_from_store(vector_store):
+    """Build a BM25 index over every document already stored in the vector store."""
+    lexical_index = BM25Index()
+    stored = vector_store.get(include=["documents", "metadatas"])
+    for document_id, text, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"]):
+        lexical_index.add(document_id, text or "", metadata or {})
+    return lexical_index
+
+def record_aliases(vector_store, indexed_files, canonical_files, lexical_index=None):
+    """Store the sorted alias file names of each canonical file in its chunks' "aliases" metadata.
+
+    The chunks of all canonical files are read and updated with one call each, however many
+    canonical files changed.
+    """
+    aliases = {}
+    for filename, entry in indexed_files.items():
+        if entry.get("duplicate_of"):
+            aliases.setdefault(entry["duplicate_of"], []).append(filename)
+
+    # Canonical file of every chunk whose metadata has to change
+    owners = {chunk_id: canonical for canonical in canonical_files
+              for chunk_id in indexed_files.get(canonical, {}).get("ids", [])}
+    if not owners:
+        return
+    stored = vector_store.get(ids=list(owners), include=["metadatas"])
+    # Chroma metadata values must be scalars, so the list is stored as JSON
+    metadatas = [dict(metadata or {}, aliases=json.dumps(sorted(aliases.get(owners[chunk_id], []))))
+                 for chunk_id, metadata in zip(stored["ids"], stored["metadatas"])]
+    # Chroma only exposes metadata-only updates on its underlying collection
+    vector_store._collection.update(ids=stored["ids"], metadatas=metadatas)
+    if lexical_index is not None:
+        for chunk_id, metadata in zip(stored["ids"], metadatas):
+            if chunk_id in lexical_index.documents:
+                lexical_index.documents[chunk_id]["metadata"] = metadata
+
+def sync_files_to_vector_store(vector_store, file_paths, iter_file_chunks, manifest_path=None,
+                               manifest_section="files", batch_size=EMBED_BATCH_SIZE,
+                               max_workers=EMBED_MAX_WORKERS, lexical_index_path=None,
+                               dedup_threshold=None, signatures_path=None, signature_text=None,
+                               on_commit=None):
+    """Incrementally sync a set of source files into the vector store.
+
+    iter_file_chunks receives the paths of the new or changed files and must yield one
+    iterable of (chunk_id, Document) pairs per file, in the same order. The pairs are consumed
+    lazily, so a loader can stream a large file, and a file is recorded in the manifest once
+    its iterable is exhausted and all of its documents are written. Every Document must carry
+    its source file name in the "filename" metadata. Entries are tracked in their own manifest
+    section so different loaders can share one manifest. When lexical_index_path is given,
+    the BM25 index stored there is kept in step with the vector store. on_commit is called
+    before the manifest records newly written files, so sidecar stores can make their
+    writes for those files durable first.
+
+    When dedup_threshold is given, files whose text is a near duplicate (MinHash estimate of
+    the Jaccard similarity at or above the threshold) of an already indexed file are not
+    embedded; they are recorded as aliases of that canonical file in the manifest and in the
+    canonical file's "aliases" metadata. When signatures_path is given, the signatures of
+    embedded files are kept in that file between runs, even while deduplication is off, so
+    later runs compare new files against the unchanged ones. Signatures are built from the
+    text of a file's chunks, or from signature_text(filename) when given, so loaders can leave
+    out text shared by unrelated files.
+    """
+    report = {"added": 0, "updated": 0, "skipped": 0, "deleted": 0}
+
+    # Load what was indexed by the previous run (empty when running without a manifest)
+    manifest = load_manifest(manifest_path)
+    indexed_files = manifest.setdefault(manifest_section, {})
+    lexical_index = None
+    if lexical_index_path:
+        if os.path.exists(lexical_index_path):
+            lexical_index = BM25Index.load(lexical_index_path)
+        else:
+            # Index vectors written before the lexical index existed, so skipped files are searchable too
+            lexical_index = build_lexical_index_from_store(vector_store)
+
+    # Files that need to be (re-)embedded, with their new content hash
+    pending_files = {}
+    # IDs of stale vectors that must be removed before the new ones are written
+    stale_ids = []
+    # Canonical files whose alias list changes during this run
+    alias_changes = set()
+
+    # Loop through each file and decide what has to be done with it
+    for file_path in file_paths:
+        filename = os.path.basename(file_path)
+        with span("ingest.hash"):
+            file_hash = compute_file_hash(file_path)
+
+        # Skip files whose content has not changed since the last run, unless they were
+        # deduplicated by an earlier run and deduplication is now turned off
+        previous_entry = indexed_files.get(filename)
+        if (previous_entry and previous_entry.get("hash") == file_hash
+                and (dedup_threshold or not previous_entry.get("duplicate_of"))):
+            report["skipped"] += 1
+            continue
+
+        if previous_entry:
+            stale_ids.extend(previous_entry.get("ids", []))
+            if previous_entry.get("duplicate_of"):
+                alias_changes.add(previous_entry["duplicate_of"])
+            report["updated"] += 1
+        else:
+            report["added"] += 1
+        # Chunk IDs are filled in once the file has been parsed and split
+        pending_files[filename] = {"hash": file_hash, "ids": [], "path": file_path}
+
+    # Remove vectors for files that no longer exist
+    present_files = {os.path.basename(file_path) for file_path in file_paths}
+    removed_files = [name for name in indexed_files if name not in present_files]
+    for removed_file in removed_files:
+        removed_entry = indexed_files.pop(removed_file)
+        stale_ids.extend(removed_entry.get("ids", []))
+        if removed_entry.get("duplicate_of"):
+            alias_changes.add(removed_entry["duplicate_of"])
+        report["deleted"] += 1
+
+    # Signatures of unchanged files; the ones of pending files are computed again below
+    signatures = {filename: signature for filename, signature in load_signatures(signatures_path).items()
+                  if filename in indexed_files and filename not in pending_files}
+    minhasher = MinHasher() if dedup_threshold or signatures_path else None
+    near_duplicates = None
+    if dedup_threshold:
+        near_duplicates = NearDuplicateIndex(dedup_threshold)
+        paths = {os.path.basename(file_path): file_path for file_path in file_paths}
+        # Aliases of changed or removed pages lost their canonical page and are processed again
+        orphaned = set(pending_files) | set(removed_files)
+        for filename, entry in indexed_files.items():
+            if entry.get("duplicate_of") in orphaned and filename not in pending_files:
+                pending_files[filename] = {"hash": entry["hash"], "ids": [], "path": paths[filename]}
+                # Counted as skipped above, but it is processed again
+                report["skipped"] -= 1
+                report["updated"] += 1
+        # Seed the index with the unchanged canonical pages, so new pages are compared against them too
+        for filename, signature in signatures.items():
+            if filename not in pending_files and not indexed_files[filename].get("duplicate_of"):
+                near_duplicates.add(filename, signature)
+        report.update({"duplicates": 0, "duplicate_documents_saved": 0})
+
+    if stale_ids:
+        vector_store.delete(ids=stale_ids)
+        if lexical_index is not None:
+            lexical_index.remove(stale_ids)
+    save_manifest(manifest, manifest_path)
+
+    # Files whose chunks have all been produced, and the number of documents written per file
+    finished_files = set()
+    written_counts = {}
+
+    def record_if_complete(filename):
+        # A file is done once every chunk it produced is stored
+        entry = pending_files[filename]
+        if filename in finished_files and written_counts.get(filename, 0) == len(entry["ids"]):
+            indexed_files[filename] = entry
+
+    def iter_documents():
+        # Build documents lazily so only the batches currently being embedded are held in memory
+        pending_paths = [entry.pop("path") for entry in pending_files.values()]
+        for (filename, entry), chunks in zip(pending_files.items(), iter_file_chunks(pending_paths)):
+            if minhasher is not None:
+                # The signature needs the whole file, so its chunks are collected first
+                chunks = list(chunks)
+            if minhasher is not None and chunks:
+                with span("ingest.dedup"):
+                    text = (signature_text(filename) if signature_text is not None
+                            else " ".join(document.page_content for _, document in chunks))
+                    signature = minhasher.signature(text)
+                    canonical = None
+                    if near_duplicates is not None and signature is not None:
+                        canonical = near_duplicates.find(signature)
+                if canonical:
+                    # Near duplicate: record it as an alias instead of embedding it again
+                    entry.update({"ids": [], "duplicate_of": canonical})
+                    indexed_files[filename] = entry
+                    alias_changes.add(canonical)
+                    report["duplicates"] += 1
+                    report["duplicate_documents_saved"] += len(chunks)
+                    continue
+                if signature is not None:
+                    signatures[filename] = signature
+                    if near_duplicates is not None:
+                        near_duplicates.add(filename, signature)
+            entry["ids"] = []
+            for chunk_id, document in chunks:
+                entry["ids"].append(chunk_id)
+                yield chunk_id, document
+            finished_files.add(filename)
+            record_if_complete(filename)
+
+    def save_progress():
+        if on_commit is not None:
+            on_commit()
+        with span("ingest.manifest"):
+            save_manifest(manifest, manifest_path)
+
+    def commit_written(batch):
+        # Record a file in the manifest once all of its documents are stored, so an
+        # interrupted run resumes from the first file that was not fully written
+        for document_id, document in batch:
+            if lexical_index is not None:
+                lexical_index.add(document_id, document.page_content, document.metadata)
+            filename = document.metadata["filename"]
+            written_counts[filename] = written_counts.get(filename, 0) + 1
+            record_if_complete(filename)
+        save_progress()
+
+    try:
+        stats = run_ingest_pipeline(
+            vector_store,
+            iter_documents(),
+            batch_size=batch_size,
+            max_workers=max_workers,
+            on_batch_written=commit_written
+        )
+        if alias_changes:
+            # Canonical pages are written before their aliases are known, so their alias list is
+            # set afterwards; this also clears the lists of pages whose aliases are embedded again
+            record_aliases(vector_store, indexed_files, alias_changes, lexical_index)
+    finally:
+        # Files completed after the last batch was written (a file is only known to be complete once
+        # the next one starts, or has no text at all) are recorded here, also when the run failed
+        save_progress()
+        # Save the lexical index even after a failure, so it matches the batches already written
+        if lexical_index is not None:
+            lexical_index.save(lexical_index_path)
+        if signatures_path:
+            save_signatures({filename: signature for filename, signature in signatures.items()
+                             if filename in present_files}, signatures_path)
+    report.update(stats)
+
+    # Print status messages indicating success
+    print(f"Loaded {stats['documents']} documents into the vector store "
+          f"({stats['docs_per_second']} docs/s, {stats['tokens_per_second']} tokens/s).")
+    print(f"Added: {report['added']}, updated: {report['updated']}, "
+          f"skipped: {report['skipped']}, deleted: {report['deleted']}")
+    if near_duplicates is not None:
+        # Every skipped batch of documents is an embedding call that didn't have to be made
+        report["embedding_calls_saved"] = math.ceil(report["duplicate_documents_saved"] / batch_size)
+        print(f"Near duplicates: {report['duplicates']} files, {report['duplicate_documents_saved']} documents "
+              f"and about {report['embedding_calls_saved']} embedding calls saved.")
+    return report
+
+def load_html_files_to_chroma(vector_store, source_folder='SourceFiles', manifest_path=None,
+                              batch_size=EMBED_BATCH_SIZE, max_workers=EMBED_MAX_WORKERS,
+                              parse_workers=None, parser=None,
+                              chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, lexical_index_path=None,
+                              link_store_path=None, dedup_threshold=DEDUP_THRESHOLD, signatures_path=None):
+    """Load HTML files from the source folder into the vector store.
+
+    When a manifest path is given, only new or changed files are embedded, vectors of
+    removed files are deleted and unchanged files are left alone. When a link store path
+    is given, the full link map of every page is kept in that SQLite sidecar. Near-duplicate
+    pages (versioned copies, print views...) are only embedded once unless dedup_threshold
+    is None; they are compared on their main content, without the navigation shared by
+    every page, and signatures_path keeps their MinHash signatures between runs. Returns a
+    report with the number of files added, updated, skipped and deleted, plus pipeline
+    throughput and deduplication savings.
+    """
     # Check if the source folder exists
     if not os.path.exists(source_folder):
         print(f"Source folder {source_folder} does not exist.")
-        return
+        return {"added": 0, "updated": 0, "skipped": 0, "deleted": 0}
 
     # Get a list of all HTML files in the source folder
-    html_files = [f for f in os.listdir(source_folder) if f.endswith('.html')]
-    
-    # List to store Document objects created from the HTML files
-    documents = []
+    html_files = sorted(f for f in os.listdir(source_folder) if f.endswith('.html'))
+    link_store = LinkStore(link_store_path) if link_store_path else None
+    # Main content of the page being processed, which near-duplicate detection compares
+    content_texts = {}
 
-    # Loop through each HTML file in the folder
-    for html_file in html_files:
-        # Create the full path to the HTML file
-        file_path = os.path.join(source_folder, html_file)
-        
-        # Generate the base URL from the filename using the format_url_from_filename function
-        base_url = format_url_from_filename(html_file)
+    def iter_file_chunks(file_paths):
+        # Parse across the process pool, then split each page into chunks
+        parsed_files = iter_parsed_html_files(file_paths, parser=parser, workers=parse_workers,
+                                              content_text=True)
+        for file_path, (text_content, urls, content_text) in zip(file_paths, parsed_files):
+            html_file = os.path.basename(file_path)
+            if dedup_threshold or signatures_path:
+                content_texts[html_file] = content_text
+            document_id = make_document_id(html_file)
+            if link_store is not None:
+                link_store.put(document_id, html_file, urls)
+            with span("ingest.chunk"):
+                document = build_html_document(html_file, text_content, urls)
+                chunks = chunk_document(document, document_id, chunk_size, chunk_overlap)
+            yield chunks
 
-        # Open and read the contents of the HTML file
-        with open(file_path, 'r', encoding='utf-8') as file:
-            content = file.read()  # Read the file's content as a string
-            
-            # Parse the content using BeautifulSoup to extract the text and URLs
-            soup = BeautifulSoup(content, 'html.parser')
-            text_content = soup.get_text()  # Extract the plain text from the HTML
-            urls = extract_urls_from_html(content)  # Extract URLs and their associated text
-
-            # Ensure that the "More Info" URL is included, defaulting to the base URL if missing
-            more_info_url = urls.get('More Info', base_url)
-            more_info_url = more_info_url if more_info_url.startswith('http') else f"https://{more_info_url}"
-            urls['More Info'] = more_info_url  # Add or update the "More Info" link in the URLs dictionary
-
-            # If no URLs were found, use the base URL as the fallback for "source_urls"
-            if not urls:
-                urls = {"More Info": base_url}  # Fallback to base URL if no URLs are found
-
-            # Convert the URLs dictionary to a JSON string to store in metadata
-            source_urls_json = json.dumps(urls)
-
-            # Create a metadata dictionary for the Document object
-            document_metadata = {
-                "base_url": base_url,  # Include the base URL
-                "filename": html_file,  # Include the filename for reference
-                "source_urls": source_urls_json  # Store extracted URLs as a JSON string
-            }
-            
-            # Create a Document object containing the extracted text and metadata
-            document = Document(page_content=text_content, metadata=document_metadata)
-            
-            # Append the Document object to the list of documents
-            documents.append(document)
-
-    # Add all the documents to the vector store
-    vector_store.add_documents(documents)
-    
-    # Print status messages indicating success
-    print(f"Loaded {len(documents)} documents into the vector store.")
+    try:
+        report = sync_files_to_vector_store(
+            vector_store,
+            [os.path.join(source_folder, html_file) for html_file in html_files],
+            iter_file_chunks,
+            manifest_path=manifest_path,
+            manifest_section="files",
+            batch_size=batch_size,
+            max_workers=max_workers,
+            lexical_index_path=lexical_index_path,
+            dedup_threshold=dedup_threshold,
+            signatures_path=signatures_path,
+            signature_text=content_texts.pop,
+            # Links are stored while parsing, so commit them before the manifest marks their pages done
+            on_commit=link_store.commit if link_store is not None else None
+        )
+        # Drop the links of pages that were removed from the source folder
+        if link_store is not None:
+            link_store.retain(html_files)
+    finally:
+        if link_store is not None:
+            link_store.close()
     print("Data loading completed successfully.")
+    return report
+
+def iter_json_array(file_path, read_size=65536):
+    """Yield (key, item) for each element of the first top-level array of a JSON export.
+
+    The file is read in blocks and decoded one array element at a time, so only the
+    element currently being processed has to fit in memory.
+    """
+    decoder = json.JSONDecoder()
+    with open(file_path, 'r', encoding='utf-8-sig') as file:
+        buffer = ''
+        key = None
+
+        # Read until the opening bracket of the array (e.g. "areas": [) has been found
+        while key is None:
+            block = file.read(read_size)
+            if not block:
+                return
+            buffer += block
+            match = re.search(r'"(\w+)"\s*:\s*\[', buffer)
+            if match:
+                key = match.group(1)
+                buffer = buffer[match.end():]
+
+        position = 0
+        while True:
+            # Skip whitespace and commas between elements
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position < len(buffer) and buffer[position] == ']':
+                return
+
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The element is incomplete: read more of the file and try again
+                block = file.read(read_size)
+                if not block:
+                    raise
+                buffer = buffer[position:] + block
+                position = 0
+                continue
+
+            yield key, item
+            buffer = buffer[end:]
+            position = 0
+
+def build_json_documents(node, json_file, path, parent_title=None):
+    """Turn one area/module/article of a JSON export into Documents, recursing into sub-modules.
+
+    Yields (path, Document) pairs where path identifies the entry inside the file.
+    """
+    title = node.get("module") or node.get("area") or node.get("topic") or parent_title or ""
+    title = title.rstrip('#').strip()
+
+    # Prefer the node's own page; articles only list anchors, so fall back to the first one without its fragment
+    href = node.get("href")
+    if not href:
+        links = [link for link in node.get("links", []) if isinstance(link, str)]
+        href = links[0].split('#')[0] if links else None
+
+    # Resolve the "More Info" link once, like for HTML pages
+    more_info_url = normalize_url(href) if href else ""
+
+    def make_document(entry_path, topic, text):
+        document_metadata = {
+            "base_url": href or "",  # Page the entry was exported from
+            "filename": json_file,  # Include the export's filename for reference
+            "topic": topic,  # Title of the area, module or section
+            "more_info_url": more_info_url  # Same field as HTML pages; empty when the entry has no page
+        }
+        return entry_path, Document(page_content=f"{topic}\n{text}", metadata=document_metadata)
+
+    # DevelopmentContent.json stores one definition string, json.json articles store "content"
+    for field in ("definition", "content"):
+        text = node.get(field)
+        if isinstance(text, str) and text.strip():
+            yield make_document(f"{path}/{field}", title, text)
+
+    # DevelopmentModule.json stores a list of {"topic", "definition"} sections per module
+    definitions = node.get("definition")
+    if isinstance(definitions, list):
+        for index, section in enumerate(definitions):
+            text = section.get("definition")
+            if isinstance(text, str) and text.strip():
+                section_title = section.get("topic", "").rstrip('#').strip()
+                topic = f"{title} - {section_title}" if section_title else title
+                yield make_document(f"{path}/definition/{index}", topic, text)
+
+    # Recurse into nested modules ("modules" in one export, "submodulos" in the other)
+    for field in ("modules", "submodulos"):
+        for index, child in enumerate(node.get(field) or []):
+            yield from build_json_documents(child, json_file, f"{path}/{field}/{index}", title)
+
+def load_json_files_to_chroma(vector_store, json_paths, manifest_path=None,
+                              batch_size=EMBED_BATCH_SIZE, max_workers=EMBED_MAX_WORKERS,
+                              chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, lexical_index_path=None):
+    """Load the structured JSON exports (DevelopmentContent.json, ...) into the vector store.
+
+    Every topic or definition becomes its own Document whose More Info URL is the entry's
+    href, written through the same batched, incremental pipeline as the HTML pages. Exports
+    are read one array element at a time and their chunks are embedded as they are built,
+    so only the batches in flight are held in memory.
+    """
+    json_paths = sorted(path for path in json_paths if os.path.exists(path))
+
+    def iter_export_chunks(file_path):
+        json_file = os.path.basename(file_path)
+        # Stream the export element by element instead of loading the whole file
+        for index, (key, item) in enumerate(iter_json_array(file_path)):
+            for index_path, document in build_json_documents(item, json_file, f"{key}/{index}"):
+                document_id = make_document_id(f"{json_file}#{index_path}")
+                yield from chunk_document(document, document_id, chunk_size, chunk_overlap)
+
+    def iter_file_chunks(file_paths):
+        for file_path in file_paths:
+            yield iter_export_chunks(file_path)
+
+    report = sync_files_to_vector_store(
+        vector_store,
+        json_paths,
+        iter_file_chunks,
+        manifest_path=manifest_path,
+        manifest_section="json_files",
+        batch_size=batch_size,
+        max_workers=max_workers,
+        lexical_index_path=lexical_index_path
+    )
+    print("JSON data loading completed successfully.")
+    return report
 
 
 
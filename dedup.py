@@ -0,0 +1,97 @@
+import os
+import re
+import zlib
+import numpy as np
+
+# Defaults for near-duplicate detection; a threshold of None disables it in the loaders
+NUM_PERMUTATIONS = 128  # Length of every MinHash signature
+LSH_BANDS = 16  # Signature bands used as LSH buckets (128 / 16 = 8 rows per band)
+SHINGLE_SIZE = 5  # Words per shingle
+DEDUP_THRESHOLD = 0.9  # Minimum estimated Jaccard similarity for two pages to count as duplicates
+
+# Mersenne prime used for the permutation hashes; it keeps every value below 2**61
+_PRIME = np.uint64((1 << 61) - 1)
+
+def shingle_hashes(text, size=SHINGLE_SIZE):
+    """Return the 32-bit hashes of the overlapping word n-grams of a text."""
+    words = re.findall(r'\w+', text.lower())
+    if len(words) < size:
+        # Very short pages are compared as a single shingle
+        return {zlib.crc32(" ".join(words).encode('utf-8'))} if words else set()
+    return {zlib.crc32(" ".join(words[index:index + size]).encode('utf-8'))
+            for index in range(len(words) - size + 1)}
+
+class MinHasher:
+    """Compute MinHash signatures whose agreement estimates the Jaccard similarity of two texts."""
+
+    def __init__(self, num_permutations=NUM_PERMUTATIONS, shingle_size=SHINGLE_SIZE, seed=1):
+        # Fixed seed: signatures are kept between runs and must stay comparable
+        rng = np.random.default_rng(seed)
+        # Coefficients below 2**31 and 32-bit shingle hashes keep a * x + b inside uint64
+        self.a = rng.integers(1, 1 << 31, size=num_permutations, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 31, size=num_permutations, dtype=np.uint64)
+        self.shingle_size = shingle_size
+
+    def signature(self, text):
+        """Return the signature of a text, or None when it has no words."""
+        hashes = shingle_hashes(text, self.shingle_size)
+        if not hashes:
+            return None
+        values = np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+        return ((np.outer(values, self.a) + self.b) % _PRIME).min(axis=0)
+
+def load_signatures(path):
+    """Load the {file name: signature} map saved with save_signatures, or an empty one."""
+    if not path or not os.path.exists(path):
+        return {}
+    with np.load(path) as data:
+        return dict(zip(data["filenames"].tolist(), data["signatures"]))
+
+def save_signatures(signatures, path):
+    """Write the {file name: signature} map atomically as one compact NumPy archive."""
+    filenames = sorted(signatures)
+    matrix = (np.stack([signatures[filename] for filename in filenames]) if filenames
+              else np.zeros((0, NUM_PERMUTATIONS), dtype=np.uint64))
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as file:
+        np.savez(file, filenames=np.array(filenames, dtype=str), signatures=matrix)
+    os.replace(temp_path, path)
+
+class NearDuplicateIndex:
+    """LSH index over MinHash signatures that finds the canonical page a new page duplicates.
+
+    Signatures are split into bands; pages sharing any band become candidates, and a
+    candidate only counts when the share of equal signature values reaches the threshold.
+    """
+
+    def __init__(self, threshold=DEDUP_THRESHOLD, bands=LSH_BANDS):
+        self.threshold = threshold
+        self.bands = bands
+        self.signatures = {}  # key -> signature
+        self.buckets = [{} for _ in range(bands)]  # per band: band bytes -> keys
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def _band_keys(self, signature):
+        rows = len(signature) // self.bands
+        return [signature[band * rows:(band + 1) * rows].tobytes() for band in range(self.bands)]
+
+    def add(self, key, signature):
+        """Register a canonical page."""
+        self.signatures[key] = signature
+        for bucket, band_key in zip(self.buckets, self._band_keys(signature)):
+            bucket.setdefault(band_key, []).append(key)
+
+    def find(self, signature):
+        """Return the key of the most similar registered page above the threshold, or None."""
+        candidates = set()
+        for bucket, band_key in zip(self.buckets, self._band_keys(signature)):
+            candidates.update(bucket.get(band_key, ()))
+
+        best_key, best_similarity = None, 0.0
+        for key in sorted(candidates):
+            similarity = float(np.mean(self.signatures[key] == signature))
+            if similarity >= self.threshold and similarity > best_similarity:
+                best_key, best_similarity = key, similarity
+        return best_key
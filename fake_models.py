@@ -0,0 +1,96 @@
+import re
+import time
+import hashlib
+import threading
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# Size of the vectors produced by FakeOllamaEmbeddings (the same as nomic-embed-text)
+FAKE_EMBEDDING_SIZE = 768
+
+class FakeOllamaEmbeddings(Embeddings):
+    """Deterministic stand-in for OllamaEmbeddings that needs no running Ollama server.
+
+    Every word is hashed into one dimension of the vector (the "hashing trick"), so texts
+    that share words get similar embeddings and retrieval results stay meaningful. Each
+    call sleeps for call_latency seconds plus text_latency seconds per text to simulate
+    the model.
+    """
+
+    def __init__(self, size=FAKE_EMBEDDING_SIZE, call_latency=0.0, text_latency=0.0):
+        self.size = size  # Number of dimensions of every vector
+        self.call_latency = call_latency  # Simulated seconds per embedding call
+        self.text_latency = text_latency  # Simulated seconds per embedded text
+        self.calls = 0  # Number of embedding calls, to compare pipelines by model round trips
+        self.texts = 0  # Number of embedded texts
+        self._lock = threading.Lock()
+
+    def _embed(self, text):
+        vector = np.zeros(self.size, dtype=np.float32)
+        for word in re.findall(r'\w+', text.lower()):
+            digest = hashlib.md5(word.encode('utf-8')).digest()
+            index = int.from_bytes(digest[:4], 'little') % self.size
+            # A hashed sign keeps colliding words from always adding up
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def _simulate_call(self, count):
+        with self._lock:
+            self.calls += 1
+            self.texts += count
+        delay = self.call_latency + self.text_latency * count
+        if delay:
+            time.sleep(delay)
+
+    def embed_documents(self, texts):
+        """Embed a batch of texts with one simulated model call."""
+        self._simulate_call(len(texts))
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        """Embed a single question with one simulated model call."""
+        self._simulate_call(1)
+        return self._embed(text)
+
+class FakeChatOllama(BaseChatModel):
+    """Deterministic stand-in for ChatOllama that streams a canned answer with simulated latency.
+
+    The answer repeats words of the question until it is answer_tokens long. The first
+    token arrives after first_token_latency seconds and every following token after
+    token_latency seconds, like a local model generating on a busy GPU. num_predict limits
+    the number of generated tokens, as it does for ChatOllama.
+    """
+
+    answer_tokens: int = 64  # Number of tokens in every answer
+    first_token_latency: float = 0.0  # Simulated seconds before the first token (prompt processing)
+    token_latency: float = 0.0  # Simulated seconds per generated token
+    num_predict: int = None  # Maximum number of tokens to generate, like ChatOllama's option
+
+    @property
+    def _llm_type(self):
+        return "fake-chat-ollama"
+
+    def _answer_tokens(self, messages, num_predict=None):
+        # Build the answer from the words of the last message (the question)
+        words = re.findall(r'\w+', messages[-1].content if messages else "") or ["answer"]
+        limit = num_predict or self.num_predict or self.answer_tokens
+        count = min(self.answer_tokens, limit)
+        return [f"{words[index % len(words)]} " for index in range(count)]
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        for index, token in enumerate(self._answer_tokens(messages, kwargs.get("num_predict"))):
+            delay = self.first_token_latency if index == 0 else self.token_latency
+            if delay:
+                time.sleep(delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        content = "".join(chunk.text for chunk in self._stream(messages, stop, run_manager, **kwargs))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
@@ -0,0 +1,135 @@
+import os
+import re
+import json
+import math
+from collections import Counter
+from langchain_core.documents import Document
+
+# Identifiers such as DEE action names or entity types are kept whole (letters, digits, underscores)
+TOKEN_PATTERN = re.compile(r"[a-z0-9_]+")
+
+def tokenize(text):
+    """Split text into lowercase terms for the lexical index."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+class BM25Index:
+    """In-process inverted index with BM25 scoring, persisted as a JSON file next to the vector store."""
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1  # Term frequency saturation
+        self.b = b  # Document length normalization
+        self.postings = {}  # term -> {document ID: term frequency}
+        self.documents = {}  # document ID -> {"text", "metadata", "length"}
+        self.total_length = 0  # Sum of all document lengths, for the average length
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add(self, document_id, text, metadata=None):
+        """Index a document, replacing any previous version with the same ID."""
+        if document_id in self.documents:
+            self.remove([document_id])
+        terms = Counter(tokenize(text))
+        for term, frequency in terms.items():
+            self.postings.setdefault(term, {})[document_id] = frequency
+        length = sum(terms.values())
+        self.documents[document_id] = {"text": text, "metadata": metadata or {}, "length": length}
+        self.total_length += length
+
+    def remove(self, document_ids):
+        """Drop documents from the index; unknown IDs are ignored."""
+        for document_id in document_ids:
+            document = self.documents.pop(document_id, None)
+            if document is None:
+                continue
+            self.total_length -= document["length"]
+            for term in set(tokenize(document["text"])):
+                documents = self.postings.get(term)
+                if documents is not None:
+                    documents.pop(document_id, None)
+                    if not documents:
+                        del self.postings[term]
+
+    def idf(self, term):
+        """Inverse document frequency of a term (0 for unknown terms)."""
+        frequency = len(self.postings.get(term, ()))
+        if not frequency:
+            return 0.0
+        return math.log(1 + (len(self.documents) - frequency + 0.5) / (frequency + 0.5))
+
+    def search(self, query, k=4):
+        """Return the k best (Document, score) pairs for a query."""
+        if not self.documents:
+            return []
+        average_length = self.total_length / len(self.documents)
+        scores = Counter()
+        for term in set(tokenize(query)):
+            idf = self.idf(term)
+            for document_id, frequency in self.postings.get(term, {}).items():
+                length = self.documents[document_id]["length"]
+                norm = self.k1 * (1 - self.b + self.b * length / average_length)
+                scores[document_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+        results = []
+        for document_id, score in scores.most_common(k):
+            document = self.documents[document_id]
+            results.append((Document(id=document_id, page_content=document["text"],
+                                     metadata=dict(document["metadata"])), score))
+        return results
+
+    def is_confident(self, query, results, max_document_share=0.01, min_margin=1.5):
+        """Tell whether lexical results alone are good enough to answer a query.
+
+        That is the case when the query contains a rare term (found in at most
+        max_document_share of the documents, e.g. an exact DEE action name) and the best
+        result scores at least min_margin times higher than the runner-up.
+        """
+        if not results:
+            return False
+        max_documents = max(1, int(len(self.documents) * max_document_share))
+        has_rare_term = any(
+            0 < len(self.postings.get(term, ())) <= max_documents for term in set(tokenize(query))
+        )
+        if not has_rare_term:
+            return False
+        if len(results) == 1:
+            return True
+        return results[0][1] >= min_margin * results[1][1]
+
+    def save(self, path):
+        """Write the index atomically to a JSON file."""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump({"k1": self.k1, "b": self.b, "documents": self.documents}, file)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load an index saved with save(), or return an empty one if the file doesn't exist."""
+        if not os.path.exists(path):
+            return cls()
+        with open(path, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+        index = cls(k1=data.get("k1", 1.5), b=data.get("b", 0.75))
+        # Postings are not stored; rebuilding them is cheap and keeps the file small
+        for document_id, document in data.get("documents", {}).items():
+            index.add(document_id, document["text"], document["metadata"])
+        return index
+
+def reciprocal_rank_fusion(rankings, k=4, constant=60):
+    """Fuse several ranked Document lists into one, scoring each by the sum of 1 / (constant + rank)."""
+    scores = Counter()
+    documents = {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking):
+            key = document_key(document)
+            scores[key] += 1.0 / (constant + rank + 1)
+            documents.setdefault(key, document)
+    return [documents[key] for key, _ in scores.most_common(k)]
+
+def document_key(document):
+    """Identify a Document across result lists by its ID, or by its page and chunk."""
+    if getattr(document, "id", None):
+        return document.id
+    metadata = document.metadata or {}
+    return (metadata.get("filename"), metadata.get("chunk_index"), document.page_content[:100])
@@ -0,0 +1,55 @@
+import json
+import sqlite3
+import threading
+
+class LinkStore:
+    """Sidecar SQLite table with the full link map of every page, keyed by document ID.
+
+    The vector store only keeps each page's resolved More Info URL; the complete
+    {link text: URL} maps live here and are read one page at a time when needed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS links ("
+                "document_id TEXT PRIMARY KEY, filename TEXT NOT NULL, links TEXT NOT NULL)"
+            )
+            self._connection.commit()
+
+    def put(self, document_id, filename, links):
+        """Store (or replace) the link map of one page; call commit() to make it durable."""
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO links (document_id, filename, links) VALUES (?, ?, ?)",
+                (document_id, filename, json.dumps(links))
+            )
+
+    def get(self, document_id):
+        """Return the link map of a page, or an empty dict when it is unknown."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT links FROM links WHERE document_id = ?", (document_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def retain(self, filenames):
+        """Delete the link maps of pages whose file is no longer in filenames."""
+        filenames = set(filenames)
+        with self._lock:
+            stored = [row[0] for row in self._connection.execute("SELECT DISTINCT filename FROM links")]
+            removed = [(filename,) for filename in stored if filename not in filenames]
+            self._connection.executemany("DELETE FROM links WHERE filename = ?", removed)
+        return len(removed)
+
+    def commit(self):
+        with self._lock:
+            self._connection.commit()
+
+    def close(self):
+        with self._lock:
+            self._connection.commit()
+            self._connection.close()
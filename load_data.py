@@ -1,10 +1,33 @@
 import os
+import sys
 import shutil
-from data_loader import load_html_files_to_chroma  # Import function for loading HTML files into Chroma
+# Loaders for the HTML pages and JSON exports, plus the parser parity check
+from data_loader import load_html_files_to_chroma, load_json_files_to_chroma, check_parse_parity, HTML_PARSER
+# Names of the files kept next to the Chroma data, and the default near-duplicate threshold
+from data_loader import (MANIFEST_FILENAME, LEXICAL_INDEX_FILENAME, LINK_STORE_FILENAME, SIGNATURES_FILENAME,
+                         DEDUP_THRESHOLD)
 from langchain_chroma import Chroma  # Import Chroma for vector storage
 from langchain_community.embeddings.ollama import OllamaEmbeddings  # Import OllamaEmbeddings for text embedding
+from numpy_store import NumpyVectorStore  # Memory-mapped alternative to Chroma
+import metrics  # Per-stage timings, printed at the end when METRICS_ENABLED=true
 
-def main():
+# Directory of the memory-mapped NumPy vector store used by VECTOR_BACKEND=numpy
+NUMPY_STORE_DIRECTORY = './numpy_store'
+
+# Structured exports of the developer portal, already split into topics and definitions
+JSON_EXPORTS = ['./DevelopmentContent.json', './DevelopmentModule.json', './json.json']
+
+def check_parity(source_folder='./SourceFiles'):
+    """Report files whose parsed output would differ from the original html.parser output."""
+    mismatches = check_parse_parity(source_folder)
+    if mismatches:
+        print(f"{len(mismatches)} files parse differently with '{HTML_PARSER}':")
+        for html_file in mismatches:
+            print(f"  {html_file}")
+    else:
+        print(f"All files parse identically with '{HTML_PARSER}'.")
+
+def main(rebuild=False, use_json=False, export_numpy=False, dedup=True):
     try:
         # Attempt to initialize the embeddings model with a specific model
         embedding = OllamaEmbeddings(model="nomic-embed-text")
@@ -16,8 +39,9 @@ def main():
     # Define the Chroma persistence directory
     persist_directory = "./chroma_db2"
     
-    # Delete the existing Chroma directory to clear old data
-    if os.path.exists(persist_directory):
+    # Only wipe the existing Chroma directory when a full rebuild is requested,
+    # otherwise the manifest lets us re-embed just the files that changed
+    if rebuild and os.path.exists(persist_directory):
         shutil.rmtree(persist_directory)
         print(f"Deleted existing Chroma directory: {persist_directory}")
     
@@ -37,19 +61,75 @@ def main():
         print(f"Error initializing Chroma: {e}")
         return
     
-    # Ensure the source folder exists
+    # Manifest that tracks file hashes between runs, and the BM25 index built alongside Chroma
+    manifest_path = os.path.join(persist_directory, MANIFEST_FILENAME)
+    lexical_index_path = os.path.join(persist_directory, LEXICAL_INDEX_FILENAME)
+    link_store_path = os.path.join(persist_directory, LINK_STORE_FILENAME)  # Full link map of every page
+    signatures_path = os.path.join(persist_directory, SIGNATURES_FILENAME)  # MinHash signatures for deduplication
+
+    # Use the JSON exports when asked to, or when there are no raw HTML pages to parse
     source_folder = './SourceFiles'
-    if not os.path.exists(source_folder):
-        print(f"Source folder {source_folder} does not exist.")
-        return
-    
-    # Load HTML files into the Chroma vector store
-    try:
-        load_html_files_to_chroma(vector_store, source_folder=source_folder)
-        print("Data loading process finished successfully.")
-    except Exception as e:
-        print(f"Error during data loading: {e}")
+    if use_json or not os.path.exists(source_folder):
+        json_paths = [path for path in JSON_EXPORTS if os.path.exists(path)]
+        if not json_paths:
+            print(f"Source folder {source_folder} does not exist and no JSON exports were found.")
+            return
+
+        # Load the JSON exports into the Chroma vector store
+        try:
+            load_json_files_to_chroma(
+                vector_store,
+                json_paths,
+                manifest_path=manifest_path,
+                lexical_index_path=lexical_index_path
+            )
+            print("Data loading process finished successfully.")
+        except Exception as e:
+            print(f"Error during data loading: {e}")
+            return
+    else:
+        # Load HTML files into the Chroma vector store
+        try:
+            load_html_files_to_chroma(
+                vector_store,
+                source_folder=source_folder,
+                manifest_path=manifest_path,
+                lexical_index_path=lexical_index_path,
+                link_store_path=link_store_path,
+                dedup_threshold=DEDUP_THRESHOLD if dedup else None,  # Embed near-duplicate pages only once
+                signatures_path=signatures_path
+            )
+            print("Data loading process finished successfully.")
+        except Exception as e:
+            print(f"Error during data loading: {e}")
+            return
+
+    # Optionally export the index to the memory-mapped NumPy backend (VECTOR_BACKEND=numpy in app.py)
+    if export_numpy:
+        NumpyVectorStore.from_chroma(vector_store, NUMPY_STORE_DIRECTORY)
+        print(f"Exported the vector store to {NUMPY_STORE_DIRECTORY}.")
+
+    # Show where the ingest time went
+    if metrics.ENABLED:
+        print_stage_timings()
+
+def print_stage_timings():
+    """Print the time spent in each ingest stage."""
+    print(f"{'stage':20} {'calls':>8} {'total s':>10} {'mean ms':>10}")
+    for stage, timing in metrics.STAGE_SECONDS.summary().items():
+        print(f"{stage:20} {timing['count']:>8} {timing['total_seconds']:>10} {timing['mean_ms']:>10}")
 
 # Ensure that the main function is called when this script is executed directly
 if __name__ == '__main__':
-    main()
+    # Pass --check-parity to only compare parser output, --rebuild to drop the existing index,
+    # --json to load the structured JSON exports instead of the HTML pages, --export-numpy to also
+    # write the memory-mapped NumPy copy of the index, --no-dedup to embed near-duplicate pages too
+    if '--check-parity' in sys.argv[1:]:
+        check_parity()
+    else:
+        main(
+            rebuild='--rebuild' in sys.argv[1:],
+            use_json='--json' in sys.argv[1:],
+            export_numpy='--export-numpy' in sys.argv[1:],
+            dedup='--no-dedup' not in sys.argv[1:]
+        )
@@ -0,0 +1,81 @@
+import sys
+import json
+import time
+import argparse
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+
+def send_query(url, question):
+    """Send one /query request and return (status code, latency in seconds)."""
+    body = json.dumps({"question": question, "chat_history": []}).encode('utf-8')
+    request = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'})
+    start_time = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=300) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code  # 503/504 responses are expected under load
+    except Exception:
+        status = 0  # Connection errors and client-side timeouts
+    return status, time.perf_counter() - start_time
+
+def percentile(values, fraction):
+    """Return the value at the given fraction (0-1) of the sorted values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+def run_load_test(url, questions, total_requests, concurrency):
+    """Fire total_requests queries at url from concurrency threads and summarize the results."""
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(
+            lambda index: send_query(url, questions[index % len(questions)]),
+            range(total_requests)
+        ))
+    elapsed = time.perf_counter() - start_time
+
+    statuses = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    # Latency percentiles only make sense for requests that were actually answered
+    latencies = [latency for status, latency in results if status == 200]
+
+    return {
+        "url": url,
+        "requests": total_requests,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+        "p50_seconds": round(percentile(latencies, 0.50), 3),
+        "p99_seconds": round(percentile(latencies, 0.99), 3),
+        "statuses": statuses
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test one or more /query servers and compare them.")
+    parser.add_argument('--url', action='append', required=True,
+                        help="Full /query URL; repeat to compare servers (e.g. dev server vs production mode)")
+    parser.add_argument('--requests', type=int, default=50, help="Total requests per server")
+    parser.add_argument('--concurrency', type=int, default=8, help="Simultaneous clients")
+    parser.add_argument('--question', action='append',
+                        help="Question to send; repeat for several (default: a DEE action question)")
+    args = parser.parse_args(argv)
+
+    questions = args.question or ["How to create a DEE action?"]
+    reports = [run_load_test(url, questions, args.requests, args.concurrency) for url in args.url]
+
+    # Print a short comparison table, then the full results as JSON
+    print(f"{'url':50} {'req/s':>8} {'p50 s':>8} {'p99 s':>8}  statuses")
+    for report in reports:
+        print(f"{report['url']:50} {report['throughput_rps']:>8} {report['p50_seconds']:>8} "
+              f"{report['p99_seconds']:>8}  {report['statuses']}")
+    print(json.dumps(reports, indent=2))
+    return reports
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,192 @@
+import os
+import time
+import threading
+
+# Instrumentation is off unless enabled; app.py and load_data.py turn it on with METRICS_ENABLED=true
+ENABLED = os.getenv("METRICS_ENABLED", "false").lower() == "true"
+
+# Upper bounds (seconds) of the latency histogram buckets, from a cached lookup up to a slow generation
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_lock = threading.Lock()
+_local = threading.local()  # Holds the stage timings of the request handled by the current thread
+
+def enable(enabled=True):
+    """Turn instrumentation on or off for the whole process."""
+    global ENABLED
+    ENABLED = enabled
+
+def _format_labels(labels):
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}" if labels else ""
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        if not ENABLED:
+            return
+        key = tuple(sorted(labels.items()))
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_format_labels(key)} {value}" for key, value in sorted(self.values.items())]
+        return lines
+
+class Gauge:
+    """Value that goes up and down, or is read from a callback when the metrics are rendered."""
+
+    def __init__(self, name, help_text, callback=None):
+        self.name = name
+        self.help_text = help_text
+        self.callback = callback  # Returns the current value, e.g. the LLM gate's in-flight count
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        if not ENABLED:
+            return
+        key = tuple(sorted(labels.items()))
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self):
+        values = {(): self.callback()} if self.callback else self.values
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        lines += [f"{self.name}{_format_labels(key)} {value}" for key, value in sorted(values.items())]
+        return lines
+
+class Histogram:
+    """Latency histogram with fixed buckets, rendered with cumulative counts like Prometheus clients."""
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.values = {}  # label key -> [bucket counts, sum, count]
+
+    def observe(self, value, **labels):
+        if not ENABLED:
+            return
+        key = tuple(sorted(labels.items()))
+        with _lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][index] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', bound),))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(key + (('le', '+Inf'),))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {round(total, 6)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+    def summary(self):
+        """Return {stage: {"count", "total_seconds", "mean_ms"}} for printing at the end of a run."""
+        with _lock:
+            return {
+                dict(key).get("stage", self.name): {
+                    "count": count,
+                    "total_seconds": round(total, 3),
+                    "mean_ms": round(total / count * 1000, 3) if count else 0.0
+                }
+                for key, (_, total, count) in sorted(self.values.items())
+            }
+
+# Metrics shared by the query path, the ingest pipeline and the web app
+STAGE_SECONDS = Histogram("stage_duration_seconds", "Time spent in each query and ingest stage.")
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Time to answer HTTP requests.")
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being handled.")
+TOKENS = Counter("llm_tokens_total", "Tokens sent to (context) and generated by (completion) the LLM.")
+_registry = [STAGE_SECONDS, REQUEST_SECONDS, REQUESTS_IN_FLIGHT, TOKENS]
+
+def register(metric):
+    """Add a metric (e.g. a Gauge reading the LLM gate) to the /metrics output."""
+    _registry.append(metric)
+    return metric
+
+def render_prometheus():
+    """Return every registered metric in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        for metric in _registry:
+            lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+class _Span:
+    """Times one stage and records it in the stage histogram and the current request's timings."""
+
+    __slots__ = ("stage", "start_time")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record_stage(self.stage, time.perf_counter() - self.start_time)
+        return False
+
+class _NullSpan:
+    """Shared do-nothing span returned while instrumentation is off."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+def record_stage(stage, seconds):
+    """Record the duration of a stage that was timed by hand (e.g. time to the first token)."""
+    if not ENABLED:
+        return
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = getattr(_local, "timings", None)
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+def span(stage):
+    """Context manager timing one stage, e.g. `with span("query.embed"): ...`.
+
+    While instrumentation is off this returns a shared no-op object, so the only cost is
+    one function call and one attribute check.
+    """
+    return _Span(stage) if ENABLED else _NULL_SPAN
+
+def start_trace():
+    """Start collecting stage timings for the request handled by this thread, returning them."""
+    _local.timings = {} if ENABLED else None
+    return _local.timings
+
+def use_trace(timings):
+    """Collect this thread's stage timings into an existing trace (for work handed to another thread)."""
+    _local.timings = timings
+
+def end_trace():
+    """Stop collecting stage timings on this thread."""
+    _local.timings = None
@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import shutil
+import threading
+from collections import namedtuple
+import numpy as np
+from langchain_core.documents import Document
+
+# File in the store directory naming the current version subdirectory
+CURRENT_FILENAME = "CURRENT"
+
+# Vector dtype written by the exports; float32 is searched straight from the mmap without any copy
+EXPORT_DTYPE = "float32"
+
+# Rows of a float16 matrix widened to float32 at a time, so a query never copies the whole matrix
+SEARCH_BLOCK_ROWS = 1024
+
+def _write_strings(path, strings):
+    """Write strings as one UTF-8 blob plus an offsets array, so single entries can be read lazily."""
+    encoded = [string.encode('utf-8') for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if encoded:
+        offsets[1:] = np.cumsum([len(data) for data in encoded])
+    with open(f"{path}.bin", 'wb') as file:
+        for data in encoded:
+            file.write(data)
+    np.save(f"{path}.offsets.npy", offsets)
+
+def _normalize_rows(vectors):
+    """Scale every row to unit length so dot products are cosine similarities."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+class _StringArray:
+    """Read-only, memory-mapped view of strings written by _write_strings."""
+
+    def __init__(self, path):
+        self.offsets = np.load(f"{path}.offsets.npy", mmap_mode='r')
+        # Empty files cannot be memory-mapped
+        size = os.path.getsize(f"{path}.bin")
+        self.data = np.memmap(f"{path}.bin", dtype=np.uint8, mode='r') if size else np.zeros(0, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        start, end = int(self.offsets[index]), int(self.offsets[index + 1])
+        return self.data[start:end].tobytes().decode('utf-8')
+
+    def to_list(self):
+        return [self[index] for index in range(len(self))]
+
+# One export as seen by a reader; searches use a single snapshot so row indexes always match its arrays
+_Snapshot = namedtuple("_Snapshot", ["version", "vectors", "ids", "texts", "metadatas"])
+
+class NumpyVectorStore:
+    """Exact-search vector store backed by memory-mapped NumPy files.
+
+    Vectors are stored L2-normalized in a float32 (default) or float16 matrix, so a matrix product
+    gives cosine similarities (the same ranking as Chroma's default L2 distance when the
+    model returns unit-length embeddings). IDs, texts and metadata are stored as UTF-8 blobs with
+    offset arrays and are only decoded for the returned results. All files are opened with
+    mmap, so every worker process shares the same pages through the OS page cache.
+
+    The store is an export of the Chroma index written in one go by from_chroma
+    (load_data.py --export-numpy), not an ingest target: a write rewrites every file. Each
+    export creates a new version subdirectory and then switches the CURRENT pointer, so
+    readers in other processes never see a half-written store and pick up the new version
+    on their next search.
+    """
+
+    def __init__(self, directory, embedding_function=None, dtype=EXPORT_DTYPE):
+        self.directory = directory  # Directory holding the store's versions
+        self.embedding_function = embedding_function  # Embeddings model used for text queries
+        self.dtype = np.dtype(dtype)  # float16 halves the size, float32 keeps full precision
+        self._lock = threading.Lock()
+        self._snapshot = _Snapshot(None, np.zeros((0, 0), dtype=self.dtype), None, None, None)
+        os.makedirs(directory, exist_ok=True)
+        self._refresh()
+
+    @property
+    def embeddings(self):
+        return self.embedding_function
+
+    def __len__(self):
+        return self._refresh().vectors.shape[0]
+
+    def _current_version(self):
+        try:
+            with open(os.path.join(self.directory, CURRENT_FILENAME), 'r', encoding='utf-8') as file:
+                return file.read().strip() or None
+        except OSError:
+            return None
+
+    def _refresh(self):
+        """Return the snapshot of the current export, re-mapping the files when a new version was written."""
+        # Another process (e.g. load_data.py --export-numpy) may have switched CURRENT
+        version = self._current_version()
+        snapshot = self._snapshot
+        if version == snapshot.version:
+            return snapshot
+        with self._lock:
+            if version == self._snapshot.version:
+                return self._snapshot
+            if version is None:
+                snapshot = _Snapshot(None, np.zeros((0, 0), dtype=self.dtype), None, None, None)
+            else:
+                version_path = os.path.join(self.directory, version)
+                snapshot = _Snapshot(
+                    version,
+                    np.load(os.path.join(version_path, "vectors.npy"), mmap_mode='r'),
+                    _StringArray(os.path.join(version_path, "ids")),
+                    _StringArray(os.path.join(version_path, "texts")),
+                    _StringArray(os.path.join(version_path, "metadatas"))
+                )
+            # Replaced in one assignment, so searches in other threads keep a consistent snapshot
+            self._snapshot = snapshot
+            return snapshot
+
+    @staticmethod
+    def _document(snapshot, index):
+        return Document(
+            id=snapshot.ids[index],
+            page_content=snapshot.texts[index],
+            metadata=json.loads(snapshot.metadatas[index])
+        )
+
+    def similarity_search(self, query, k=4):
+        """Return the k documents most similar to a text query."""
+        return self.similarity_search_by_vector(self.embedding_function.embed_query(query), k=k)
+
+    def similarity_search_by_vector(self, embedding, k=4):
+        """Return the k documents most similar to a query embedding."""
+        return self.similarity_search_batch_by_vector([embedding], k=k)[0]
+
+    def similarity_search_batch_by_vector(self, embeddings, k=4):
+        """Run several queries with one matrix product, returning one result list per query."""
+        snapshot = self._refresh()
+        vectors = snapshot.vectors
+        if not len(embeddings):
+            return []
+        if vectors.shape[0] == 0:
+            return [[] for _ in embeddings]
+
+        queries = _normalize_rows(embeddings)
+        if vectors.dtype == np.float32:
+            # Multiplied straight from the mmap, so workers only share the page cache
+            similarities = queries @ vectors.T
+        else:
+            # float16 stores are widened one block at a time to bound the per-query allocation
+            similarities = np.empty((len(queries), vectors.shape[0]), dtype=np.float32)
+            for start in range(0, vectors.shape[0], SEARCH_BLOCK_ROWS):
+                block = vectors[start:start + SEARCH_BLOCK_ROWS]
+                similarities[:, start:start + len(block)] = queries @ block.T.astype(np.float32)
+
+        k = min(k, vectors.shape[0])
+        # argpartition finds the top k in linear time; only those k are then sorted
+        top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        results = []
+        for row, candidates in zip(similarities, top):
+            ordered = candidates[np.argsort(-row[candidates])]
+            results.append([self._document(snapshot, int(index)) for index in ordered])
+        return results
+
+    def get(self, ids=None, include=None):
+        """Return stored IDs, texts and metadata in the same shape as Chroma's get()."""
+        snapshot = self._refresh()
+        if snapshot.ids is None:
+            return {"ids": [], "documents": [], "metadatas": []}
+        indexes = range(len(snapshot.ids))
+        if ids is not None:
+            wanted = set(ids)
+            indexes = [index for index in indexes if snapshot.ids[index] in wanted]
+        return {
+            "ids": [snapshot.ids[index] for index in indexes],
+            "documents": [snapshot.texts[index] for index in indexes],
+            "metadatas": [json.loads(snapshot.metadatas[index]) for index in indexes]
+        }
+
+    def _write_version(self, ids, texts, metadatas, vectors):
+        # Write a complete new version, then point CURRENT at it
+        version = f"v{time.time_ns()}"
+        version_path = os.path.join(self.directory, version)
+        os.makedirs(version_path)
+        np.save(os.path.join(version_path, "vectors.npy"), np.asarray(vectors, dtype=self.dtype))
+        _write_strings(os.path.join(version_path, "ids"), ids)
+        _write_strings(os.path.join(version_path, "texts"), texts)
+        _write_strings(os.path.join(version_path, "metadatas"), [json.dumps(metadata) for metadata in metadatas])
+
+        current_path = os.path.join(self.directory, CURRENT_FILENAME)
+        with open(f"{current_path}.tmp", 'w', encoding='utf-8') as file:
+            file.write(version)
+        os.replace(f"{current_path}.tmp", current_path)
+        self._refresh()
+
+        # Old versions may still be mapped by other processes; deletion fails harmlessly on Windows
+        for name in os.listdir(self.directory):
+            if name.startswith('v') and name != version:
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    @classmethod
+    def from_chroma(cls, chroma_store, directory, dtype=EXPORT_DTYPE, embedding_function=None):
+        """Export every vector, text and metadata entry of a Chroma store, replacing the store's contents."""
+        stored = chroma_store.get(include=["embeddings", "documents", "metadatas"])
+        store = cls(directory, embedding_function or chroma_store.embeddings, dtype=dtype)
+        vectors = _normalize_rows(stored["embeddings"]) if len(stored["ids"]) else np.zeros((0, 0), dtype=np.float32)
+        store._write_version(list(stored["ids"]), list(stored["documents"]),
+                             [metadata or {} for metadata in stored["metadatas"]], vectors)
+        return store
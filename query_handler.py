@@ -1,55 +1,352 @@
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.runnables import RunnablePassthrough
+from langchain_core.documents import Document
+from text_utils import count_tokens, truncate_to_tokens
+from lexical_index import reciprocal_rank_fusion
+from metrics import span, record_stage, TOKENS
+from cache import embed_query_batch
+from url_utils import normalize_url, url_from_filename
+import metrics
+from concurrent.futures import ThreadPoolExecutor
 import json
-import re
+import time
 
-def handle_query(vector_store, embedding, llm, question, chat_history):
+# Number of chunks fetched from the vector store for each question
+SEARCH_K = 6
+
+# Maximum number of tokens of retrieved context sent to the LLM
+MAX_CONTEXT_TOKENS = 1500
+
+# Retrieval modes: "vector" (embeddings only), "hybrid" (BM25 fused with embeddings) or "lexical" (BM25 only)
+RETRIEVAL_MODES = ("vector", "hybrid", "lexical")
+
+def handle_query(vector_store, embedding, llm, question, chat_history, k=SEARCH_K,
+                 max_context_tokens=MAX_CONTEXT_TOKENS, answer_cache=None, lexical_index=None,
+                 retrieval_mode="vector"):
+    # Check if the embedding model is available
+    if embedding is None:
+        raise Exception("Embedding model is not available")
+
+    # Cached answers were written without any conversation, so follow-up questions bypass the cache
+    if chat_history:
+        answer_cache = None
+
+    # Find the documents for the question, or a stored answer for a near-identical question
+    results, query_embedding, cached = search_documents(
+        vector_store, embedding, question, k, answer_cache, lexical_index, retrieval_mode
+    )
+    if cached:
+        return cached_response(cached, chat_history)
+    return answer_from_results(llm, question, chat_history, results, query_embedding,
+                               max_context_tokens, answer_cache)
+
+def answer_from_results(llm, question, chat_history, results, query_embedding,
+                        max_context_tokens=MAX_CONTEXT_TOKENS, answer_cache=None, raise_errors=False):
+    """Generate the answer for a question from its search results.
+
+    LLM failures become a generic error answer, or are raised when raise_errors is set.
+    """
+    # Build the context for the question and the "More Info" URL of the best page
+    context_messages, more_info_url = build_context(results, max_context_tokens)
+    with span("query.prompt"):
+        rag_chain, input_data = build_rag_chain(llm, context_messages, chat_history, question)
+
+    try:
+        # Invoke the chain and get the AI response, stripping any extra spaces
+        with span("query.generate"):
+            ai_msg = rag_chain.invoke(input_data)
+        response_message = ai_msg.content.strip()
+        count_generation_tokens(context_messages, response_message)
+        generated = True
+    except Exception as e:
+        if raise_errors:
+            raise
+        # Handle any errors that occur during the process
+        print(f"Error during query handling: {e}")
+        response_message = "An error occurred while processing your query."
+        generated = False
+
+    # Remember successful answers for similar questions (the lexical fast path has no embedding to key on)
+    if answer_cache is not None and generated and query_embedding is not None:
+        answer_cache.store(query_embedding, response_message, more_info_url)
+
+    # Combine the AI response with the "More Info" link
+    answer_with_link = f"{response_message}{format_more_info_link(more_info_url)}"
+
+    # Prepare the final response, including chat history
+    response = {
+        "answer": answer_with_link,
+        "more_info_url": more_info_url,
+        "chat_history": chat_history
+    }
+    
+    # Return the response with the AI's answer and the updated chat history
+    return response
+
+def stream_query(vector_store, embedding, llm, question, chat_history, k=SEARCH_K,
+                 max_context_tokens=MAX_CONTEXT_TOKENS, answer_cache=None, lexical_index=None,
+                 retrieval_mode="vector"):
+    """Answer a question like handle_query, yielding the answer while it is generated.
+
+    Yields ("token", text) events for each piece of the answer, followed by a single
+    ("done", response) event whose response has the same shape as handle_query's.
+    """
     # Check if the embedding model is available
     if embedding is None:
         raise Exception("Embedding model is not available")
 
+    # Cached answers were written without any conversation, so follow-up questions bypass the cache
+    if chat_history:
+        answer_cache = None
+
+    results, query_embedding, cached = search_documents(
+        vector_store, embedding, question, k, answer_cache, lexical_index, retrieval_mode
+    )
+
+    # A cached answer is sent as one token so clients handle both cases the same way
+    if cached:
+        yield "token", cached[0]
+        yield "done", cached_response(cached, chat_history)
+        return
+
+    context_messages, more_info_url = build_context(results, max_context_tokens)
+    with span("query.prompt"):
+        rag_chain, input_data = build_rag_chain(llm, context_messages, chat_history, question)
+
+    # Forward every chunk produced by the LLM as soon as it arrives
+    pieces = []
+    try:
+        stream_start = time.perf_counter()
+        with span("query.generate"):
+            for chunk in rag_chain.stream(input_data):
+                if chunk.content:
+                    # Time to the first token is what the user waits for before anything is shown
+                    if not pieces:
+                        record_stage("query.first_token", time.perf_counter() - stream_start)
+                    pieces.append(chunk.content)
+                    yield "token", chunk.content
+        response_message = "".join(pieces).strip()
+        count_generation_tokens(context_messages, response_message)
+        generated = True
+    except Exception as e:
+        print(f"Error during query handling: {e}")
+        response_message = "An error occurred while processing your query."
+        generated = False
+
+    if answer_cache is not None and generated and query_embedding is not None:
+        answer_cache.store(query_embedding, response_message, more_info_url)
+
+    yield "done", {
+        "answer": f"{response_message}{format_more_info_link(more_info_url)}",
+        "more_info_url": more_info_url,
+        "chat_history": chat_history
+    }
+
+def search_documents(vector_store, embedding, question, k=SEARCH_K, answer_cache=None,
+                     lexical_index=None, retrieval_mode="vector"):
+    """Find the documents for a question.
+
+    Returns (results, query_embedding, cached). cached is an (answer, more_info_url) pair
+    when the answer cache already knows the question, and query_embedding is None when the
+    lexical fast path answered without calling the embedding model.
+    """
+    if retrieval_mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode: {retrieval_mode}")
+
+    lexical_results = []
+    if lexical_index is not None and retrieval_mode != "vector":
+        with span("query.lexical_search"):
+            lexical_results = lexical_index.search(question, k)
+        # Exact identifiers (DEE action names, entity types...) are found reliably by BM25 alone
+        if retrieval_mode == "lexical" or lexical_index.is_confident(question, lexical_results):
+            return [document for document, _ in lexical_results], None, None
+
+    # Embed the question once; it is reused for the answer cache and the similarity search
+    with span("query.embed"):
+        query_embedding = embedding.embed_query(question)
+
+    # Return a stored answer when a near-identical question was answered before
+    if answer_cache is not None:
+        with span("query.answer_cache"):
+            cached = answer_cache.lookup(query_embedding)
+        if cached:
+            return [], query_embedding, cached
+
     # Perform a similarity search in the vector store using the user's question
-    results = vector_store.similarity_search(question, k=2)
+    with span("query.search"):
+        results = vector_store.similarity_search_by_vector(query_embedding, k=k)
+
+    # Combine both rankings so documents found by either method can make it into the context
+    if lexical_results:
+        with span("query.fusion"):
+            results = reciprocal_rank_fusion([results, [document for document, _ in lexical_results]], k=k)
+    return results, query_embedding, None
+
+def embed_questions(embedding, questions):
+    """Embed several questions with a single embed_documents call (cached ones are not re-embedded)."""
+    if hasattr(embedding, "embed_queries"):
+        return embedding.embed_queries(questions)
+    return embed_query_batch(embedding, questions)
+
+def search_by_vectors(vector_store, query_embeddings, k=SEARCH_K):
+    """Run one similarity search per vector, as a single batched search when the store supports it."""
+    if not query_embeddings:
+        return []
+    # The NumPy store scores every question with one matrix product
+    if hasattr(vector_store, "similarity_search_batch_by_vector"):
+        return vector_store.similarity_search_batch_by_vector(query_embeddings, k=k)
+    return [vector_store.similarity_search_by_vector(query_embedding, k=k) for query_embedding in query_embeddings]
+
+def search_documents_batch(vector_store, embedding, questions, k=SEARCH_K, answer_cache=None,
+                           lexical_index=None, retrieval_mode="vector"):
+    """Find the documents for several questions at once.
 
-    # Initialize an empty list to hold context messages and set default values for URLs
-    context_messages = []
-    base_url = "https://developer.criticalmanufacturing.com"  # Default base URL if no better one is found
-    more_info_url = None  # This will store the "More Info" URL if found
+    Works like search_documents, returning one (results, query_embedding, cached) triple per
+    question, but embeds every question that needs a vector in one call and searches the
+    vector store with all of them together.
+    """
+    if retrieval_mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode: {retrieval_mode}")
 
+    searches = [None] * len(questions)
+    lexical_results = [[] for _ in questions]
+    if lexical_index is not None and retrieval_mode != "vector":
+        with span("batch.lexical_search"):
+            for index, question in enumerate(questions):
+                lexical_results[index] = lexical_index.search(question, k)
+                # Questions the lexical index answers confidently need no embedding at all
+                if retrieval_mode == "lexical" or lexical_index.is_confident(question, lexical_results[index]):
+                    searches[index] = ([document for document, _ in lexical_results[index]], None, None)
+
+    pending = [index for index, search in enumerate(searches) if search is None]
+    with span("batch.embed"):
+        query_embeddings = embed_questions(embedding, [questions[index] for index in pending]) if pending else []
+
+    # Questions answered before reuse their stored answer and skip the vector search
+    to_search = []
+    for index, query_embedding in zip(pending, query_embeddings):
+        cached = answer_cache.lookup(query_embedding) if answer_cache is not None else None
+        if cached:
+            searches[index] = ([], query_embedding, cached)
+        else:
+            to_search.append((index, query_embedding))
+
+    with span("batch.search"):
+        batch_results = search_by_vectors(vector_store, [query_embedding for _, query_embedding in to_search], k)
+
+    for (index, query_embedding), results in zip(to_search, batch_results):
+        if lexical_results[index]:
+            results = reciprocal_rank_fusion([results, [document for document, _ in lexical_results[index]]], k=k)
+        searches[index] = (results, query_embedding, None)
+    return searches
+
+def handle_query_batch(vector_store, embedding, llm, questions, k=SEARCH_K,
+                       max_context_tokens=MAX_CONTEXT_TOKENS, answer_cache=None, lexical_index=None,
+                       retrieval_mode="vector", max_concurrency=4, run_generation=None):
+    """Answer many independent questions, e.g. for QA jobs or FAQ pre-generation.
+
+    All questions are embedded with one call and searched together; answers are then
+    generated with at most max_concurrency LLM calls in flight. run_generation(fn, *args)
+    can wrap each generation, e.g. to take a slot of the server's LLM gate. Returns one
+    response per question, in the original order, each holding either "answer" and
+    "more_info_url" or an "error" message.
+    """
+    # Check if the embedding model is available
+    if embedding is None:
+        raise Exception("Embedding model is not available")
+
+    responses = [None] * len(questions)
+    valid = []
+    for index, question in enumerate(questions):
+        if isinstance(question, str) and question.strip():
+            valid.append(index)
+        else:
+            responses[index] = {"error": "No question provided"}
+
+    try:
+        searches = search_documents_batch(vector_store, embedding, [questions[index] for index in valid],
+                                          k, answer_cache, lexical_index, retrieval_mode)
+    except Exception as e:
+        # Without retrieval no question in the batch can be answered
+        for index in valid:
+            responses[index] = {"error": f"Retrieval failed: {e}"}
+        return responses
+
+    def answer(index, search):
+        results, query_embedding, cached = search
+        if cached:
+            response = cached_response(cached, [])
+        else:
+            generate = run_generation or (lambda fn, *args: fn(*args))
+            response = generate(answer_from_results, llm, questions[index], [], results, query_embedding,
+                                max_context_tokens, answer_cache, True)
+        response.pop("chat_history", None)  # Batch questions are independent, without history
+        return response
+
+    # Generate in parallel but collect in input order; one failing question doesn't fail the batch
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+        futures = [(index, executor.submit(answer, index, search)) for index, search in zip(valid, searches)]
+        for index, future in futures:
+            try:
+                responses[index] = future.result()
+            except Exception as e:
+                responses[index] = {"error": str(e) or type(e).__name__}
+    return responses
+
+def cached_response(cached, chat_history):
+    """Build a query response from an (answer, more_info_url) pair of the answer cache."""
+    cached_answer, cached_url = cached
+    return {
+        "answer": f"{cached_answer}{format_more_info_link(cached_url)}",
+        "more_info_url": cached_url,
+        "chat_history": chat_history,
+        "cached": True
+    }
+
+def build_context(results, max_context_tokens=MAX_CONTEXT_TOKENS):
+    """Turn search results into context messages and the cleaned "More Info" URL."""
+    # Keep only the best chunks that fit the context budget, merging neighbours from the same page
+    with span("query.context"):
+        context_documents = select_context_chunks(results, max_context_tokens)
+
+    # The AI uses these chunks as context for answering
+    context_messages = [("system", document.page_content) for document in context_documents]
+
+    with span("query.url_cleanup"):
+        more_info_url = find_more_info_url(results)
+    return context_messages, more_info_url
+
+def find_more_info_url(results):
+    """Return the "More Info" URL of the best-ranked result that has one."""
     # Loop through the results from the similarity search
     for result in results:
-        # Append the content of the result to the context_messages list
-        context_messages.append(("system", result.page_content))  # The AI uses this context for answering
-        
         # Extract metadata from the result
         metadata = result.metadata
         if not metadata:
             continue  # Skip if no metadata is found
 
-        # Try to extract the "More Info" URL from the "source_urls" in metadata
+        # The URL is resolved and normalized at ingest, so it can be used as-is
+        more_info_url = metadata.get("more_info_url")
+        if more_info_url:
+            return more_info_url
+
+        # Indexes built before the URL was resolved at ingest still store the whole link map
         if "source_urls" in metadata:
             try:
-                # Load the source URLs stored as a JSON string
-                source_urls = json.loads(metadata["source_urls"])
-                # Look specifically for the "More Info" link within the URLs
-                more_info_url = source_urls.get("More Info", None)
+                more_info_url = json.loads(metadata["source_urls"]).get("More Info")
             except json.JSONDecodeError as e:
-                # If there's an error in decoding JSON, log the error and skip
                 print(f"Error decoding JSON source_urls: {e}")
-                more_info_url = None
-        else:
-            # If "source_urls" is not available, try to use the "source" metadata field
-            if "source" in metadata:
-                source_url = metadata["source"].strip()
-                more_info_url = format_source_url(source_url, base_url)
-
-        # Log metadata for debugging purposes
-        print("Result metadata:", metadata)
+        elif "source" in metadata:
+            more_info_url = format_source_url(metadata["source"].strip())
 
         # Stop searching once a valid "More Info" URL is found
         if more_info_url:
-            break
+            return normalize_url(more_info_url)
 
+    return None
+
+def build_rag_chain(llm, context_messages, chat_history, question):
+    """Assemble the prompt and LLM into a chain, returning it with its input data."""
     # Create the system prompt for the AI model to set the assistant's behavior
     qa_system_prompt = """You are an AI Assistant that will answer questions in the context of Critical Manufacturing MES. 
     When answering, try to be polite every time. Do not say "In the context you gave me..." to start a conversation. 
@@ -83,61 +380,84 @@ def handle_query(vector_store, embedding, llm, question, chat_history):
         "chat_history": chat_history,
         "question": question
     }
+    return rag_chain, input_data
 
-    try:
-        # Invoke the chain and get the AI response
-        ai_msg = rag_chain.invoke(input_data)
-    except Exception as e:
-        # Handle any errors that occur during the process
-        print(f"Error during query handling: {e}")
-        ai_msg = "An error occurred while processing your query."
-
-    # Get the response from the AI model and strip any extra spaces
-    response_message = ai_msg.content.strip()
-
-    # Ensure proper URL formatting for the "More Info" link if available
-    if more_info_url:
-        # Optionally clean the URL to remove unwanted segments
-        if '/developer/criticalmanufacturing/com/' in more_info_url:
-            more_info_url = more_info_url.replace('/developer/criticalmanufacturing/com/', '/')
-        more_info_url = clean_url(more_info_url)  # Clean the URL for common issues
-        # Generate a "More Info" link to append to the response
-        more_info_link = f'<br><br>For more information: <a href="{more_info_url}" target="_blank">{more_info_url}</a>'
-    else:
-        more_info_link = ""  # If no URL is found, don't add a link
+def count_generation_tokens(context_messages, response_message):
+    """Add the context and answer sizes of one generation to the token counters."""
+    # Skip counting the words when nobody collects the numbers
+    if not metrics.ENABLED:
+        return
+    TOKENS.inc(sum(count_tokens(content) for _, content in context_messages), kind="context")
+    TOKENS.inc(count_tokens(response_message), kind="completion")
 
-    # Combine the AI response with the "More Info" link
-    answer_with_link = f"{response_message}{more_info_link}"
+def format_more_info_link(more_info_url):
+    """Build the "More Info" link appended to answers, or an empty string without a URL."""
+    if not more_info_url:
+        return ""  # If no URL is found, don't add a link
+    return f'<br><br>For more information: <a href="{more_info_url}" target="_blank">{more_info_url}</a>'
 
-    # Prepare the final response, including chat history
-    response = {
-        "answer": answer_with_link,
-        "chat_history": chat_history
-    }
-    
-    # Return the response with the AI's answer and the updated chat history
-    return response
+def select_context_chunks(results, max_context_tokens=MAX_CONTEXT_TOKENS, merge_adjacent=True):
+    """Pick the best-ranked chunks that fit the token budget, optionally merging adjacent ones."""
+    selected = []
+    used_tokens = 0
+    for result in results:
+        tokens = count_tokens(result.page_content)
+        if used_tokens + tokens > max_context_tokens:
+            # Never send an empty context: cut the best result down to the budget instead
+            if not selected:
+                truncated = truncate_to_tokens(result.page_content, max_context_tokens)
+                selected.append(Document(page_content=truncated, metadata=result.metadata))
+                used_tokens = count_tokens(truncated)
+            # A smaller, lower-ranked chunk may still fit
+            continue
+        selected.append(result)
+        used_tokens += tokens
+
+    if merge_adjacent:
+        selected = merge_adjacent_chunks(selected)
+    return selected
+
+def merge_adjacent_chunks(documents):
+    """Merge overlapping or touching chunks of the same page into one, keeping ranking order.
+
+    Chunks are grouped by their parent document ID rather than by file name: every topic of
+    a JSON export shares the export's file name and starts at offset 0.
+    """
+    merged = []
+    # Last merged document per parent document, so later chunks can be appended to it
+    by_document = {}
+    # Process chunks in page order so each one can only extend the previous one
+    in_page_order = sorted(enumerate(documents), key=lambda item: (
+        item[1].metadata.get("document_id", ""), item[1].metadata.get("offset", -1)))
+    positions = {}
+
+    for rank, document in in_page_order:
+        metadata = document.metadata or {}
+        document_id = metadata.get("document_id")
+        offset = metadata.get("offset")
+        previous = by_document.get(document_id)
+
+        if previous is not None and offset is not None:
+            previous_end = previous.metadata["offset"] + len(previous.page_content)
+            if offset <= previous_end:
+                # Skip the part of this chunk that overlaps the previous one
+                previous.page_content += document.page_content[previous_end - offset:]
+                positions[id(previous)] = min(positions[id(previous)], rank)
+                continue
+
+        current = Document(page_content=document.page_content, metadata=dict(metadata))
+        positions[id(current)] = rank
+        merged.append(current)
+        if document_id is not None and offset is not None:
+            by_document[document_id] = current
+
+    # Restore the ranking order of the best chunk in each merged group
+    merged.sort(key=lambda document: positions[id(document)])
+    return merged
 
 #  function to format source URLs correctly
-def format_source_url(source_url, base_url):
-    """Format source URL from metadata correctly."""
-    source_url = source_url.replace("___", "/").replace("_", "/").replace(".html", "")
-    if not source_url.startswith("http"):
-        source_url = f"{base_url}/{source_url.lstrip('/')}"
-
-    # Ensure the URL starts with http:// or https://
-    if not source_url.startswith("http"):
-        source_url = f"https://{source_url.lstrip('/')}"
-
-    return source_url
-
-#  function to clean URL and fix common issues
-def clean_url(url):
-    """Clean and fix common issues in URLs."""
-    # Remove duplicate slashes
-    url = re.sub(r'(?<!:)//+', '/', url)
-    # Ensure URL starts with http or https
-    if not url.startswith("http"):
-        url = f"https://{url.lstrip('/')}"
-
-    return url
+def format_source_url(source_url):
+    """Format a source URL or mirrored file name from metadata as a portal URL."""
+    if source_url.startswith("http"):
+        return normalize_url(source_url)
+    return url_from_filename(source_url)
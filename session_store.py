@@ -0,0 +1,102 @@
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from text_utils import count_tokens
+
+def window_messages(messages, max_tokens):
+    """Split messages into (older, recent) where recent are the latest messages that fit max_tokens."""
+    used_tokens = 0
+    start = len(messages)
+    # Walk back from the newest message until the budget is used up
+    for index in range(len(messages) - 1, -1, -1):
+        tokens = count_tokens(messages[index].get("content", ""))
+        if used_tokens + tokens > max_tokens:
+            break
+        used_tokens += tokens
+        start = index
+    return messages[:start], messages[start:]
+
+def summarize_messages(llm, summary, messages):
+    """Fold older messages into the running conversation summary with one LLM call."""
+    transcript = "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+    prompt = [
+        ("system", "Summarize the conversation between a user and the Critical Manufacturing MES assistant "
+                   "in a few sentences. Keep product names, entities and decisions. Reply with the summary only."),
+        ("human", f"Current summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}")
+    ]
+    return llm.invoke(prompt).content.strip()
+
+class SessionStore:
+    """Keep chat sessions on the server, keyed by session ID.
+
+    Each session holds its most recent messages and an optional running summary of the
+    older ones. Sessions expire after ttl seconds without activity, and the least recently
+    used sessions are dropped once max_sessions is reached.
+    """
+
+    def __init__(self, ttl=3600, max_sessions=1000, max_history_tokens=1000, summarize=False):
+        self.ttl = ttl  # Seconds of inactivity before a session is dropped
+        self.max_sessions = max_sessions  # Maximum number of sessions kept in memory
+        self.max_history_tokens = max_history_tokens  # Token budget for chat history in the prompt
+        self.summarize = summarize  # Compact older turns into a summary instead of dropping them
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        # Sessions are ordered by last use, so expired ones are always at the front
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session["updated_at"] <= self.ttl and len(self._sessions) <= self.max_sessions:
+                break
+            del self._sessions[session_id]
+
+    def get_or_create(self, session_id=None):
+        """Return the ID of an existing session, or of a new one when it is unknown or expired."""
+        now = time.time()
+        with self._lock:
+            self._evict(now)
+            if session_id not in self._sessions:
+                session_id = uuid.uuid4().hex
+                self._sessions[session_id] = {"messages": [], "summary": "", "updated_at": now}
+            self._sessions.move_to_end(session_id)
+            self._sessions[session_id]["updated_at"] = now
+            return session_id
+
+    def prompt_history(self, session_id):
+        """Return the chat history to put in the prompt: the summary, then the recent messages."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return []
+            _, recent = window_messages(session["messages"], self.max_history_tokens)
+            history = list(recent)
+            if session["summary"]:
+                history.insert(0, {"role": "system", "content": f"Summary of the earlier conversation: {session['summary']}"})
+            return history
+
+    def add_turn(self, session_id, question, answer, llm=None):
+        """Record a question and its answer, then drop or summarize messages outside the token budget."""
+        turn = [{"role": "user", "content": question}, {"role": "ai", "content": answer}]
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return turn
+            session["messages"].extend(turn)
+            session["updated_at"] = time.time()
+            older, recent = window_messages(session["messages"], self.max_history_tokens)
+            # Messages outside the window are never sent again, so don't keep them around
+            session["messages"] = recent
+            summary = session["summary"]
+
+        # Summarize outside the lock; the LLM call can take a while
+        if older and self.summarize and llm is not None:
+            try:
+                summary = summarize_messages(llm, summary, older)
+            except Exception as e:
+                print(f"Error summarizing chat history: {e}")
+                return turn
+            with self._lock:
+                if session_id in self._sessions:
+                    self._sessions[session_id]["summary"] = summary
+        return turn
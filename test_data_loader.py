@@ -0,0 +1,237 @@
+import os
+import json
+import random
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import data_loader
+from data_loader import (parse_html, parse_html_file, iter_parsed_html_files, check_parse_parity,
+                         select_html_parser, load_html_files_to_chroma, load_json_files_to_chroma, load_manifest,
+                         MANIFEST_FILENAME)
+from fake_models import FakeOllamaEmbeddings
+
+# Pages shaped like the SourceFiles mirror, including the malformed markup it contains
+HTML_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_fixtures', 'html')
+
+def fixture_paths():
+    return sorted(os.path.join(HTML_FIXTURES, name) for name in os.listdir(HTML_FIXTURES) if name.endswith('.html'))
+
+def expected_output(path):
+    """(text, links) the original two-pass loader produced for a fixture, saved in expected_parse.json."""
+    with open(os.path.join(HTML_FIXTURES, 'expected_parse.json'), 'r', encoding='utf-8') as file:
+        expected = json.load(file)[os.path.basename(path)]
+    return expected["text"], expected["links"]
+
+def read_fixture(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        return file.read()
+
+try:
+    import lxml  # noqa: F401
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+
+class ParseParityTest(unittest.TestCase):
+    def test_parse_html_matches_original_output(self):
+        for path in fixture_paths():
+            with self.subTest(page=os.path.basename(path)):
+                self.assertEqual(parse_html(read_fixture(path)), expected_output(path))
+
+    def test_nested_anchors_keep_html_parser_link_texts(self):
+        _, urls = parse_html("<a href='/a'>A<a href='/b'>B</a>")
+        self.assertEqual(urls, {'AB': 'https://developer.criticalmanufacturing.com/a',
+                                'B': 'https://developer.criticalmanufacturing.com/b'})
+
+    def test_process_pool_keeps_order_and_output(self):
+        paths = fixture_paths()
+        self.assertEqual(list(iter_parsed_html_files(paths, workers=2)),
+                         [parse_html_file(path) for path in paths])
+
+    def test_check_parse_parity_on_fixtures(self):
+        self.assertEqual(check_parse_parity(HTML_FIXTURES), [])
+
+    @unittest.skipUnless(HAS_LXML, "lxml is not installed")
+    def test_lxml_output_differs(self):
+        # lxml closes an unclosed <a> before the next one, so it stays opt-in (HTML_PARSER=lxml)
+        _, urls = parse_html("<a href='/a'>A<a href='/b'>B</a>", parser='lxml')
+        self.assertEqual(urls, {'A': 'https://developer.criticalmanufacturing.com/a',
+                                'B': 'https://developer.criticalmanufacturing.com/b'})
+        self.assertEqual(check_parse_parity(HTML_FIXTURES, parser='lxml'),
+                         [os.path.basename(path) for path in fixture_paths()])
+
+    def test_default_parser_is_html_parser(self):
+        with mock.patch.dict(os.environ, {}, clear=False):
+            os.environ.pop("HTML_PARSER", None)
+            self.assertEqual(select_html_parser(), 'html.parser')
+
+class IngestTestCase(unittest.TestCase):
+    """Runs the HTML loader against a temporary source folder and Chroma directory."""
+
+    def setUp(self):
+        from langchain_chroma import Chroma
+        self.directory = tempfile.mkdtemp()
+        self.source_folder = os.path.join(self.directory, 'SourceFiles')
+        os.makedirs(self.source_folder)
+        self.manifest_path = os.path.join(self.directory, MANIFEST_FILENAME)
+        self.embedding = FakeOllamaEmbeddings(size=64)
+        self.vector_store = Chroma(collection_name="test_ingest", embedding_function=self.embedding,
+                                   persist_directory=os.path.join(self.directory, 'chroma'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def write_page(self, filename, body, chrome=""):
+        with open(os.path.join(self.source_folder, filename), 'w', encoding='utf-8') as file:
+            file.write(f"<html><body><nav>{chrome}</nav><main><p>{body}</p></main></body></html>")
+
+    def load(self, **kwargs):
+        return load_html_files_to_chroma(self.vector_store, source_folder=self.source_folder,
+                                         manifest_path=self.manifest_path, parse_workers=1, **kwargs)
+
+    def indexed_files(self):
+        return load_manifest(self.manifest_path)["files"]
+
+    def stored_ids(self):
+        return set(self.vector_store.get()["ids"])
+
+    def manifest_ids(self):
+        return {chunk_id for entry in self.indexed_files().values() for chunk_id in entry["ids"]}
+
+def random_words(count, seed):
+    rng = random.Random(seed)
+    return " ".join(f"word{rng.randrange(5000)}" for _ in range(count))
+
+def counts(report):
+    return {name: report[name] for name in ("added", "updated", "skipped", "deleted")}
+
+class IncrementalSyncTest(IngestTestCase):
+    def setUp(self):
+        super().setUp()
+        for index in range(4):
+            self.write_page(f"page{index}.html", random_words(50, index))
+
+    def test_added_updated_skipped_and_deleted_files(self):
+        self.assertEqual(counts(self.load()), {"added": 4, "updated": 0, "skipped": 0, "deleted": 0})
+        self.assertEqual(self.stored_ids(), self.manifest_ids())
+        self.assertEqual(len(self.stored_ids()), 4)
+
+        self.assertEqual(counts(self.load()), {"added": 0, "updated": 0, "skipped": 4, "deleted": 0})
+
+        # Grow one page to several chunks, delete another and add a new one
+        self.write_page("page1.html", random_words(1000, 10))
+        os.remove(os.path.join(self.source_folder, "page2.html"))
+        self.write_page("page4.html", random_words(50, 4))
+        report = self.load()
+        self.assertEqual(counts(report), {"added": 1, "updated": 1, "skipped": 2, "deleted": 1})
+        indexed_files = self.indexed_files()
+        self.assertNotIn("page2.html", indexed_files)
+        self.assertGreater(len(indexed_files["page1.html"]["ids"]), 1)
+        self.assertEqual(self.stored_ids(), self.manifest_ids())
+
+        # Shrinking the page again removes the chunks it no longer has
+        self.write_page("page1.html", random_words(50, 11))
+        self.assertEqual(counts(self.load())["updated"], 1)
+        self.assertEqual(len(self.indexed_files()["page1.html"]["ids"]), 1)
+        self.assertEqual(self.stored_ids(), self.manifest_ids())
+
+    def test_manifest_version_change_reembeds_everything(self):
+        self.load()
+        with mock.patch.object(data_loader, 'MANIFEST_VERSION', data_loader.MANIFEST_VERSION + 1):
+            report = self.load()
+        # Files of an outdated manifest are updated in place, replacing their old vectors
+        self.assertEqual(counts(report), {"added": 0, "updated": 4, "skipped": 0, "deleted": 0})
+        self.assertEqual(report["documents"], 4)
+        self.assertEqual(self.stored_ids(), self.manifest_ids())
+
+    def test_interrupted_run_resumes_from_unwritten_files(self):
+        embed_documents = self.embedding.embed_documents
+        calls = []
+
+        def failing_embed_documents(texts):
+            calls.append(len(texts))
+            if len(calls) > 2:
+                raise RuntimeError("embedding model went away")
+            return embed_documents(texts)
+
+        with mock.patch.object(self.embedding, 'embed_documents', failing_embed_documents), \
+             mock.patch.object(data_loader.time, 'sleep'):
+            with self.assertRaises(RuntimeError):
+                self.load(batch_size=1, max_workers=1)
+        self.assertEqual(sorted(self.indexed_files()), ["page0.html", "page1.html"])
+
+        report = self.load()
+        self.assertEqual(counts(report), {"added": 2, "updated": 0, "skipped": 2, "deleted": 0})
+        self.assertEqual(report["documents"], 2)
+        self.assertEqual(self.stored_ids(), self.manifest_ids())
+
+    def test_alias_is_reprocessed_when_its_canonical_page_changes(self):
+        body = random_words(200, 20)
+        self.write_page("guide.html", body)
+        self.write_page("guide_print.html", body, chrome="Print view")
+        self.load()
+        indexed_files = self.indexed_files()
+        self.assertEqual(indexed_files["guide_print.html"]["duplicate_of"], "guide.html")
+        self.assertEqual(indexed_files["guide_print.html"]["ids"], [])
+
+        # The canonical page changes, so its former alias has to be embedded on its own
+        self.write_page("guide.html", random_words(200, 21))
+        report = self.load()
+        self.assertEqual(counts(report), {"added": 0, "updated": 2, "skipped": 4, "deleted": 0})
+        indexed_files = self.indexed_files()
+        self.assertNotIn("duplicate_of", indexed_files["guide_print.html"])
+        self.assertTrue(indexed_files["guide_print.html"]["ids"])
+        self.assertEqual(self.stored_ids(), self.manifest_ids())
+        metadata = self.vector_store.get(ids=indexed_files["guide.html"]["ids"])["metadatas"][0]
+        self.assertEqual(json.loads(metadata.get("aliases", "[]")), [])
+
+class DeduplicationTest(IngestTestCase):
+    def test_pages_are_compared_without_their_navigation(self):
+        shared_chrome, other_chrome = random_words(1500, 1), random_words(1500, 2)
+        body, other_body = random_words(120, 3), random_words(120, 4)
+        self.write_page("a.html", body, shared_chrome)
+        self.write_page("b.html", other_body, shared_chrome)  # Same chrome, different body
+        self.write_page("c.html", body, other_chrome)  # Same body, different chrome
+
+        report = self.load()
+        indexed_files = self.indexed_files()
+        self.assertEqual(report["duplicates"], 1)
+        self.assertNotIn("duplicate_of", indexed_files["b.html"])
+        self.assertTrue(indexed_files["b.html"]["ids"])
+        self.assertEqual(indexed_files["c.html"]["duplicate_of"], "a.html")
+        self.assertEqual(indexed_files["c.html"]["ids"], [])
+
+class JsonStreamingTest(IngestTestCase):
+    def test_export_is_embedded_while_it_is_read(self):
+        export_path = os.path.join(self.directory, 'export.json')
+        topics = [{"topic": f"Topic {index}", "definition": random_words(30, index)} for index in range(200)]
+        with open(export_path, 'w', encoding='utf-8') as file:
+            json.dump({"article": topics}, file)
+
+        elements_read = []
+        read_before_first_embedding = []
+        iter_json_array = data_loader.iter_json_array
+
+        def counting_iter_json_array(file_path, *args, **kwargs):
+            for element in iter_json_array(file_path, *args, **kwargs):
+                elements_read.append(element)
+                yield element
+
+        embed_documents = self.embedding.embed_documents
+
+        def recording_embed_documents(texts):
+            read_before_first_embedding.append(len(elements_read))
+            return embed_documents(texts)
+
+        with mock.patch.object(data_loader, 'iter_json_array', counting_iter_json_array), \
+             mock.patch.object(self.embedding, 'embed_documents', recording_embed_documents):
+            report = load_json_files_to_chroma(self.vector_store, [export_path], manifest_path=self.manifest_path,
+                                               batch_size=8, max_workers=1)
+
+        self.assertEqual(report["documents"], 200)
+        self.assertLess(read_before_first_embedding[0], 200)
+        self.assertEqual(len(load_manifest(self.manifest_path)["json_files"]["export.json"]["ids"]), 200)
+
+if __name__ == '__main__':
+    unittest.main()
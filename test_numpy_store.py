@@ -0,0 +1,62 @@
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from numpy_store import NumpyVectorStore
+
+class FakeChroma:
+    """Just enough of a Chroma store for from_chroma."""
+
+    def __init__(self, prefix, count, seed):
+        self.embeddings = None
+        self.vectors = np.random.default_rng(seed).standard_normal((count, 8)).astype(np.float32)
+        self.ids = [f"{prefix}{index}" for index in range(count)]
+
+    def get(self, include=None):
+        return {"ids": self.ids, "documents": [f"text of {id_}" for id_ in self.ids],
+                "metadatas": [{"source": id_} for id_ in self.ids], "embeddings": self.vectors}
+
+class NumpyVectorStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_search_returns_the_nearest_documents(self):
+        chroma = FakeChroma("doc", 20, seed=0)
+        store = NumpyVectorStore.from_chroma(chroma, self.directory)
+        results = store.similarity_search_by_vector(chroma.vectors[7], k=3)
+        self.assertEqual(results[0].id, "doc7")
+        self.assertEqual(results[0].metadata, {"source": "doc7"})
+        self.assertEqual(len(results), 3)
+
+    def test_float16_export_matches_float32_ranking(self):
+        chroma = FakeChroma("doc", 50, seed=1)
+        store = NumpyVectorStore.from_chroma(chroma, self.directory, dtype="float16")
+        self.assertEqual(store._refresh().vectors.dtype, np.float16)
+        self.assertEqual(store.similarity_search_by_vector(chroma.vectors[3], k=1)[0].id, "doc3")
+
+    def test_search_uses_one_export_while_a_new_one_is_switched_in(self):
+        old = FakeChroma("old", 20, seed=2)
+        store = NumpyVectorStore.from_chroma(old, self.directory)
+        new_export = FakeChroma("new", 3, seed=3)
+        document = NumpyVectorStore._document
+        exported = []
+
+        def export_then_read(snapshot, index):
+            # Another thread exports a smaller store and refreshes between scoring and reading the rows
+            if not exported:
+                exported.append(NumpyVectorStore.from_chroma(new_export, self.directory))
+                store._refresh()
+            return document(snapshot, index)
+
+        store._document = export_then_read
+        results = store.similarity_search_by_vector(old.vectors[15], k=5)
+        self.assertEqual(results[0].id, "old15")
+        self.assertTrue(all(result.id.startswith("old") for result in results))
+        # The next search sees the new export
+        self.assertEqual(store.similarity_search_by_vector(new_export.vectors[1], k=1)[0].id, "new1")
+
+if __name__ == '__main__':
+    unittest.main()
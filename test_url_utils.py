@@ -0,0 +1,55 @@
+import unittest
+from url_utils import normalize_url, url_from_filename
+
+# (file name, expected URL) pairs covering the file name patterns seen in the mirror
+FILENAME_CASES = [
+    ("https___developer.criticalmanufacturing.com_analytics_subscribereports.html",
+     "https://developer.criticalmanufacturing.com/analytics/subscribereports/"),
+    ("https___developer_criticalmanufacturing_com_analytics_customdatawarehousecubes.html",
+     "https://developer.criticalmanufacturing.com/analytics/customdatawarehousecubes/"),
+    ("https___developer.criticalmanufacturing.com.html",
+     "https://developer.criticalmanufacturing.com/"),
+    ("business_dee___actions.html",
+     "https://developer.criticalmanufacturing.com/business/dee/actions/"),
+    ("analytics_subscribereports",
+     "https://developer.criticalmanufacturing.com/analytics/subscribereports/"),
+]
+
+# (link, expected URL) pairs covering the broken More Info links seen in the mirror
+LINK_CASES = [
+    ("https://developer.criticalmanufacturing.comhttps://developer.criticalmanufacturing.com"
+     "//developer/criticalmanufacturing/com/analytics/customdatawarehousecubes//",
+     "https://developer.criticalmanufacturing.com/analytics/customdatawarehousecubes/"),
+    ("https:/developer.criticalmanufacturing.com/analytics/subscribereports",
+     "https://developer.criticalmanufacturing.com/analytics/subscribereports/"),
+    ("https://developer.criticalmanufacturing.com/developer.criticalmanufacturing.com/business/",
+     "https://developer.criticalmanufacturing.com/business/"),
+    ("/developer/criticalmanufacturing/com/integration/",
+     "https://developer.criticalmanufacturing.com/integration/"),
+    ("developer.criticalmanufacturing.com/presentation",
+     "https://developer.criticalmanufacturing.com/presentation/"),
+    ("https://developer.criticalmanufacturing.com/files/guide.pdf",
+     "https://developer.criticalmanufacturing.com/files/guide.pdf"),
+    ("https://docs.microsoft.com/en-us/sql/reporting-services",
+     "https://docs.microsoft.com/en-us/sql/reporting-services"),
+]
+
+class UrlFromFilenameTest(unittest.TestCase):
+    def test_mirror_file_names(self):
+        for filename, expected in FILENAME_CASES:
+            with self.subTest(filename=filename):
+                self.assertEqual(url_from_filename(filename), expected)
+
+class NormalizeUrlTest(unittest.TestCase):
+    def test_more_info_links(self):
+        for link, expected in LINK_CASES:
+            with self.subTest(link=link):
+                self.assertEqual(normalize_url(link), expected)
+
+    def test_normalized_urls_are_stable(self):
+        for _, expected in FILENAME_CASES + LINK_CASES:
+            with self.subTest(url=expected):
+                self.assertEqual(normalize_url(expected), expected)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,17 @@
+def count_tokens(text):
+    """Approximate the number of tokens in a text by counting whitespace-separated words."""
+    # Good enough for throughput reporting and budgets without pulling in a tokenizer
+    return len(text.split())
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut a text after its first max_tokens whitespace-separated words, keeping the original spacing."""
+    words = text.split()
+    if len(words) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    # Find where the last kept word ends in the original text
+    position = 0
+    for word in words[:max_tokens]:
+        position = text.index(word, position) + len(word)
+    return text[:position]
@@ -0,0 +1,59 @@
+import re
+from urllib.parse import urlsplit, urlunsplit
+
+# Host of the developer portal the SourceFiles mirror was downloaded from
+PORTAL_HOST = "developer.criticalmanufacturing.com"
+
+# The mirror turns the host into path segments, with dots ("/developer.criticalmanufacturing.com/")
+# or with slashes ("/developer/criticalmanufacturing/com/") depending on how the name was converted
+HOST_PATH_PATTERN = re.compile(r'^/(?:developer\.criticalmanufacturing\.com|developer/criticalmanufacturing/com)(?=/|$)')
+
+# URLs whose path ends in a file name keep it without a trailing slash
+FILE_PATH_PATTERN = re.compile(r'\.\w{1,5}$')
+
+def normalize_url(url):
+    """Turn a More Info link from the mirror into a canonical portal URL.
+
+    Fixes the broken forms produced by the mirror and older cleanup code: repeated schemes
+    ("https://hosthttps://host//..."), a single slash after the scheme, relative paths, the
+    host repeated as path segments and doubled slashes. Portal URLs always end with a slash;
+    links to other sites are only trimmed.
+    """
+    url = url.strip()
+    # Keep the last absolute URL when several were glued together
+    schemes = [match.start() for match in re.finditer(r'https?:/', url)]
+    if schemes:
+        url = url[schemes[-1]:]
+    url = re.sub(r'^(https?):/+', r'\1://', url)
+
+    if not url.startswith(('http://', 'https://')):
+        # Relative links and bare host names belong to the portal
+        path = url.lstrip('/')
+        url = f"https://{path}" if path.startswith(PORTAL_HOST) else f"https://{PORTAL_HOST}/{path}"
+
+    scheme, host, path, query, fragment = urlsplit(url)
+    host = host.lower()
+    path = re.sub(r'/{2,}', '/', path)
+    if host != PORTAL_HOST:
+        return urlunsplit((scheme, host, path, query, fragment))
+
+    path = HOST_PATH_PATTERN.sub('', path) or '/'
+    if not path.endswith('/') and not FILE_PATH_PATTERN.search(path):
+        path += '/'
+    return urlunsplit(('https', host, path, query, fragment))
+
+def url_from_filename(filename):
+    """Build the portal URL of a mirrored page from its file name.
+
+    Handles names with or without the "https___" prefix and with the host in dot form
+    ("developer.criticalmanufacturing.com_...") or underscore form ("developer_criticalmanufacturing_com_...").
+    Remaining underscores separate path segments.
+    """
+    name = filename[:-len('.html')] if filename.endswith('.html') else filename
+    name = re.sub(r'^https?___', '', name)
+    for host in (PORTAL_HOST, PORTAL_HOST.replace('.', '_')):
+        if name == host or name.startswith(f"{host}_"):
+            name = name[len(host):]
+            break
+    path = re.sub(r'_+', '/', name).strip('/')
+    return normalize_url(f"https://{PORTAL_HOST}/{path}")